@@ -0,0 +1,62 @@
+"""
+Memory footprint of the datasets with their stored and their compact dtypes.
+
+Run from the repository root:
+
+    python benchmarks/bench_dtypes.py [--columns]
+
+Each dataset file is converted twice. The first conversion keeps the stored
+types, like WELL_EXPLORER_COMPACT_DTYPES=0. The second applies the schema's
+compact dtypes (see datasets.compact_table). For each file one JSON line gives
+the deep pandas memory usage and the conversion time of both frames. With
+--columns there is also one line per column that changed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import pyarrow.parquet as pq
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def footprint(path, columns=False):
+    """Yield the before/after records of one parquet file."""
+    from datasets import table_to_frame
+
+    frames, seconds = {}, {}
+    for label, compact in (('stored', False), ('compact', True)):
+        # table_to_frame releases the table's buffers as it converts, so each conversion reads its own
+        table = pq.read_table(path)
+        start = time.perf_counter()
+        frames[label] = table_to_frame(table, compact=compact)
+        seconds[label] = time.perf_counter() - start
+    usage = {label: frame.memory_usage(deep=True, index=False) for label, frame in frames.items()}
+
+    before, after = int(usage['stored'].sum()), int(usage['compact'].sum())
+    yield {'file': os.path.basename(path), 'rows': len(frames['stored']),
+           'stored_mb': round(before / 1e6, 3), 'compact_mb': round(after / 1e6, 3),
+           'ratio': round(after / before, 3) if before else None,
+           'stored_s': round(seconds['stored'], 4), 'compact_s': round(seconds['compact'], 4)}
+    if columns:
+        for col in frames['stored'].columns:
+            dtypes = str(frames['stored'][col].dtype), str(frames['compact'][col].dtype)
+            if dtypes[0] != dtypes[1]:
+                yield {'file': os.path.basename(path), 'column': col, 'stored_dtype': dtypes[0],
+                       'compact_dtype': dtypes[1], 'stored_kb': round(usage['stored'][col] / 1e3, 1),
+                       'compact_kb': round(usage['compact'][col] / 1e3, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the memory saved by the compact dtypes.")
+    parser.add_argument("--columns", action="store_true", help="Also report every column whose dtype changed")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    from datasets import METADATA_PATH, WELLS_PATH
+    for path in (WELLS_PATH, METADATA_PATH):
+        for record in footprint(path, args.columns):
+            print(json.dumps(record), flush=True)
@@ -0,0 +1,89 @@
+"""
+Import-time cost of the app modules.
+
+Run from the repository root:
+
+    python benchmarks/bench_imports.py [--modules well_functions,mapping] [--repeat 5] [--top 10]
+
+Every module is imported `repeat` times, each in a fresh interpreter started
+with `python -X importtime`. Each module produces one JSON line. The line gives
+the median wall time of the import and the heavy libraries the import loaded.
+It also lists the imported modules with the largest cumulative cost, taken
+from the fastest run.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ['profiling', 'figure_cache', 'datasets', 'well_functions', 'mapping', 'query',
+                   'interpolation', 'waterlevels', 'warmup']
+
+# Libraries that should only be loaded on first use
+HEAVY_LIBRARIES = ['numpy', 'pandas', 'pyarrow', 'plotly', 'scipy', 'shapely', 'geopandas', 'streamlit']
+
+# Run in the child: time the import and list which heavy libraries it loaded
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'wall_s': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def parse_importtime(stderr):
+    """(cumulative us, nesting depth, module) of every entry in `-X importtime` output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            entries.append((int(cumulative), depth, name.strip()))
+    return entries
+
+
+def measure_import(module, repeat=5, top=10):
+    """Import module in `repeat` fresh interpreters; return its record."""
+    runs = []
+    for _ in range(repeat):
+        probe = _PROBE.format(module=module, heavy=HEAVY_LIBRARIES)
+        child = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=ROOT,
+                               capture_output=True, text=True, check=True)
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        runs.append((result['wall_s'], result['loaded'], child.stderr))
+
+    fastest = min(runs, key=lambda run: run[0])
+    # Entries are listed as each import finishes, so the module's own imports are
+    # the nested entries just before its top-level entry
+    entries = parse_importtime(fastest[2])
+    own = max(i for i, (_, depth, name) in enumerate(entries) if depth == 0 and name == module)
+    start = own
+    while start > 0 and entries[start - 1][1] > 0:
+        start -= 1
+    slowest = sorted(entries[start:own], reverse=True)[:top]
+    return {
+        'module': module,
+        'wall_s': round(statistics.median(run[0] for run in runs), 4),
+        'min_s': round(fastest[0], 4),
+        'heavy_loaded': fastest[1],
+        'slowest_imports': [{'module': name, 'cumulative_ms': round(us / 1000, 2)}
+                            for us, _, name in slowest],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import time of the app modules.")
+    parser.add_argument("--modules", default=",".join(DEFAULT_MODULES), help="Comma-separated module names")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imported modules listed per module")
+    args = parser.parse_args()
+
+    for module in args.modules.split(","):
+        print(json.dumps(measure_import(module, args.repeat, args.top)), flush=True)
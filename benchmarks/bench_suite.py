@@ -0,0 +1,211 @@
+"""
+Headless benchmarks for the plotting and data functions.
+
+Run from the repository root:
+
+    python benchmarks/bench_suite.py [--scales 1,10,100] [--top 3] [--out results.jsonl]
+    python benchmarks/bench_suite.py --compare baseline.jsonl results.jsonl
+
+For every scale factor the wells and metadata parquet files are replicated
+with jittered coordinates into a temporary directory, and a fresh worker
+process times get_summary_stats, make_boxplot, make_histogram,
+make_scatter_xyz, make_well_vertical_plot and plot_wells_on_map for every
+group column (all wells and its largest groups). Each result is one JSON line
+with the cold (uncached) latency, the latency of a cached repeat, peak traced
+memory and the figure JSON size.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WELLS_FILE = os.path.join(ROOT, "wells_cleaned_main.parquet")
+METADATA_FILE = os.path.join(ROOT, "wells_metadata.parquet")
+
+# Standard deviation of the coordinate jitter added to replicated wells (degrees)
+JITTER_DEGREES = 0.01
+
+
+def write_scaled(source, dest, factor, jitter=True, seed=0):
+    """Write `factor` copies of a parquet file, offsetting OBJECTID and jittering DD_LAT/DD_LONG."""
+    table = pq.read_table(source)
+    names = {name.lower().strip(): name for name in table.column_names}
+    objectid = table[names['objectid']].to_numpy()
+    id_step = int(objectid.max()) + 1
+    rng = np.random.default_rng(seed)
+    with pq.ParquetWriter(dest, table.schema) as writer:
+        for copy in range(factor):
+            replica = table.set_column(table.column_names.index(names['objectid']), names['objectid'],
+                                       pa.array(objectid + copy * id_step, type=table[names['objectid']].type))
+            if jitter and copy > 0:
+                for col in ('dd_lat', 'dd_long'):
+                    if col in names:
+                        values = replica[names[col]].to_numpy(zero_copy_only=False)
+                        replica = replica.set_column(replica.column_names.index(names[col]), names[col],
+                                                     pa.array(values + rng.normal(0, JITTER_DEGREES, len(values))))
+            writer.write_table(replica.cast(table.schema))
+
+
+def measure(func, *args, **kwargs):
+    """Time func cold (caches cleared) and cached, then measure its peak memory; return the record fields."""
+    import figure_cache
+    import stats_engine
+
+    def clear():
+        figure_cache.clear_figure_cache()
+        stats_engine.clear_summary_cache()
+
+    clear()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    latency = time.perf_counter() - start
+
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    cached = time.perf_counter() - start
+
+    # Memory is traced on a separate cold call since tracing slows allocation-heavy code
+    clear()
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    record = {
+        'latency_s': round(latency, 6),
+        'cached_s': round(cached, 6),
+        'peak_mb': round(peak / 1e6, 3),
+    }
+    if hasattr(result, 'to_json') and hasattr(result, 'layout'):
+        record['traces'] = len(result.data)
+        record['json_bytes'] = len(result.to_json())
+    else:
+        record['rows'] = len(result)
+    return record
+
+
+def run_worker(scale, top, value_col, point_budget, group_cols=None):
+    """Benchmark every function on the dataset the environment points at; yield records."""
+    import resource
+
+    from datasets import get_wells
+    import mapping
+    import well_functions as wf
+
+    start = time.perf_counter()
+    wells = get_wells()
+    index = wf.get_group_index()
+    load_s = time.perf_counter() - start
+    base = {'scale': scale, 'wells': len(wells), 'value_col': value_col, 'point_budget': point_budget}
+    yield {**base, 'function': 'load', 'latency_s': round(load_s, 6)}
+
+    _, all_group_cols = wf.get_available_columns()
+    for group_col in group_cols or all_group_cols:
+        yield {**base, 'function': 'get_summary_stats', 'group_col': group_col, 'group': None,
+               **measure(wf.get_summary_stats, value_col, group_col)}
+
+        largest = list(index.group_sizes(group_col).nlargest(top).index)
+        for group in [None] + largest:
+            size = len(wf.select_group(wells, group_col, group))
+            cases = [
+                ('make_boxplot', wf.make_boxplot, (value_col, group_col, group), {}),
+                ('make_histogram', wf.make_histogram, (value_col, group, group_col), {}),
+                ('make_scatter_xyz', wf.make_scatter_xyz, (value_col, group, group_col),
+                 {'point_budget': point_budget}),
+            ]
+            # The app only draws the profile and the map once a group is selected
+            if group is not None:
+                cases += [
+                    ('make_well_vertical_plot', wf.make_well_vertical_plot, (wells,),
+                     {'selected_group': group, 'group_col': group_col}),
+                    ('plot_wells_on_map', mapping.plot_wells_on_map, (wells, group, group_col),
+                     {'show_subbasin': True, 'show_amas': True, 'point_budget': point_budget}),
+                ]
+            for name, func, args, kwargs in cases:
+                yield {**base, 'function': name, 'group_col': group_col, 'group': group,
+                       'group_rows': size, **measure(func, *args, **kwargs)}
+
+    yield {**base, 'function': 'process', 'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def run_suite(scales, top, value_col, point_budget, group_cols, out):
+    """Build each scaled dataset and benchmark it in a fresh worker process."""
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            env = dict(os.environ)
+            if scale != 1:
+                wells_path = os.path.join(tmp, f"wells_x{scale}.parquet")
+                metadata_path = os.path.join(tmp, f"metadata_x{scale}.parquet")
+                write_scaled(WELLS_FILE, wells_path, scale)
+                write_scaled(METADATA_FILE, metadata_path, scale, jitter=False)
+                env.update(WELL_EXPLORER_WELLS=wells_path, WELL_EXPLORER_METADATA=metadata_path)
+            command = [sys.executable, os.path.abspath(__file__), "--worker", "--scales", str(scale),
+                       "--top", str(top), "--value-col", value_col]
+            if point_budget is not None:
+                command += ["--point-budget", str(point_budget)]
+            if group_cols:
+                command += ["--group-cols", ",".join(group_cols)]
+            print(f"Scale {scale}x...", file=sys.stderr)
+            worker = subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, check=True, text=True)
+            out.write(worker.stdout)
+            out.flush()
+
+
+def compare(baseline_path, results_path):
+    """Print latency and figure size ratios of results against a baseline run."""
+    def load(path):
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return {(r['scale'], r['function'], r.get('group_col'), r.get('group')): r for r in records}
+
+    baseline, results = load(baseline_path), load(results_path)
+    print(f"{'scale':>5}  {'function':<24} {'group_col':<14} {'group':<28} {'latency':>10} {'ratio':>7} {'json':>7}")
+    for key, record in results.items():
+        before = baseline.get(key)
+        if before is None or not before.get('latency_s') or 'latency_s' not in record:
+            continue
+        scale, function, group_col, group = key
+        json_ratio = f"{record['json_bytes'] / before['json_bytes']:.2f}x" if before.get('json_bytes') else "-"
+        print(f"{scale:>5}  {function:<24} {str(group_col or ''):<14} {str(group or 'all')[:28]:<28} "
+              f"{record['latency_s']:>9.3f}s {record['latency_s'] / before['latency_s']:>6.2f}x {json_ratio:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the plotting and data functions headlessly.")
+    parser.add_argument("--scales", default="1,10,100", help="Comma-separated dataset replication factors")
+    parser.add_argument("--top", type=int, default=3, help="Largest groups benchmarked per group column")
+    parser.add_argument("--value-col", default="well_depth")
+    parser.add_argument("--point-budget", type=int, default=None,
+                        help="Level-of-detail point budget for the scatter and map (default: off)")
+    parser.add_argument("--group-cols", default=None, help="Comma-separated subset of group columns")
+    parser.add_argument("--out", default=None, help="JSON-lines output file (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"),
+                        help="Compare two result files instead of running")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    group_cols = args.group_cols.split(",") if args.group_cols else None
+    if args.compare:
+        compare(*args.compare)
+    elif args.worker:
+        for record in run_worker(int(args.scales), args.top, args.value_col, args.point_budget, group_cols):
+            print(json.dumps(record), flush=True)
+    else:
+        scales = [int(s) for s in args.scales.split(",")]
+        out = open(args.out, "w") if args.out else sys.stdout
+        try:
+            run_suite(scales, args.top, args.value_col, args.point_budget, group_cols, out)
+        finally:
+            if args.out:
+                out.close()
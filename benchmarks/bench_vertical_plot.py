@@ -0,0 +1,105 @@
+"""
+Compare the batched make_well_vertical_plot against the old per-row version.
+
+Run from the repository root:
+
+    python benchmarks/bench_vertical_plot.py [--limit N] [--skip-legacy]
+
+Reports trace count, figure JSON size and build time for both versions on
+wells_cleaned_main.parquet joined with wells_metadata.parquet.
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from well_functions import DEFAULT_HEIGHT, ensure_coordinates, make_well_vertical_plot
+
+
+def legacy_well_vertical_plot(df, metadata=None, depth_mode='wl_dtw'):
+    """The original one-trace-per-well implementation, kept for comparison."""
+    df.columns = df.columns.str.lower().str.strip()
+
+    if metadata is not None:
+        metadata.columns = metadata.columns.str.lower().str.strip()
+        if 'objectid' in df.columns and 'objectid' in metadata.columns:
+            df = df.merge(metadata[['objectid', 'water_use']], on='objectid', how='left')
+
+    df = ensure_coordinates(df)
+
+    if depth_mode == 'wl_dtw':
+        df = df.dropna(subset=['x', 'y', 'well_alt', 'wl_dtw'])
+        df['z_top'] = df['well_alt']
+        df['z_bottom'] = df['well_alt'] - df['wl_dtw']
+    else:
+        df = df.dropna(subset=['x', 'y', 'well_alt', 'wl_dtw', 'well_depth'])
+        df['z_top'] = df['well_alt'] - df['wl_dtw']
+        df['z_bottom'] = df['well_alt'] - df['well_depth']
+
+    water_uses = df['water_use'].dropna().unique()
+    color_map = dict(zip(water_uses, px.colors.qualitative.Plotly[:len(water_uses)]))
+
+    fig = go.Figure()
+    for water_use, group in df.groupby('water_use'):
+        color = color_map.get(water_use, 'gray')
+        for _, row in group.iterrows():
+            fig.add_trace(go.Scatter3d(
+                x=[row['x'], row['x']],
+                y=[row['y'], row['y']],
+                z=[row['z_top'], row['z_bottom']],
+                mode='lines',
+                line=dict(color=color, width=3),
+                name=water_use,
+                hovertext=(
+                    f"Well ID: {row.get('site_id', 'N/A')}<br>"
+                    f"Water Use: {row.get('water_use', 'N/A')}<br>"
+                    f"Elevation: {row['z_top']:.2f} m<br>"
+                    f"DTW: {row.get('wl_dtw', 'N/A')}<br>"
+                    f"Depth: {row.get('well_depth', 'N/A')}"
+                ),
+                hoverinfo='text',
+                showlegend=False
+            ))
+        fig.add_trace(go.Scatter3d(
+            x=[None], y=[None], z=[None],
+            mode='lines',
+            line=dict(color=color, width=4),
+            name=water_use,
+            showlegend=True
+        ))
+
+    fig.update_layout(height=DEFAULT_HEIGHT, title="Vertical Profile of Wells by Water Use")
+    return fig
+
+
+def measure(name, build):
+    start = time.perf_counter()
+    fig = build()
+    build_s = time.perf_counter() - start
+    payload = len(fig.to_json())
+    print(f"{name:<10} traces={len(fig.data):>7}  json={payload / 1e6:>9.2f} MB  build={build_s:>8.2f} s")
+    return fig
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N wells.")
+    parser.add_argument("--depth-mode", default="wl_dtw", choices=["wl_dtw", "well_depth"])
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the batched version.")
+    args = parser.parse_args()
+
+    wells = pd.read_parquet("wells_cleaned_main.parquet")
+    metadata = pd.read_parquet("wells_metadata.parquet")
+    if args.limit:
+        wells = wells.head(args.limit)
+    print(f"Wells: {len(wells)}  depth_mode={args.depth_mode}")
+
+    measure("batched", lambda: make_well_vertical_plot(wells.copy(), metadata=metadata.copy(), depth_mode=args.depth_mode))
+    if not args.skip_legacy:
+        measure("per-row", lambda: legacy_well_vertical_plot(wells.copy(), metadata=metadata.copy(), depth_mode=args.depth_mode))
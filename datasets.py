@@ -0,0 +1,251 @@
+import json
+import os
+import threading
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from profiling import timed
+
+# Dataset files; the environment overrides let benchmarks point the app at scaled copies
+WELLS_PATH = os.environ.get("WELL_EXPLORER_WELLS", "wells_cleaned_main.parquet")
+METADATA_PATH = os.environ.get("WELL_EXPLORER_METADATA", "wells_metadata.parquet")
+
+# Coordinate aliases added to the wells table
+DERIVED_WELL_COLUMNS = {'x': 'dd_long', 'y': 'dd_lat'}
+
+# Metadata columns joined onto the wells table by objectid
+JOINED_METADATA_COLUMNS = ['water_use']
+
+# Arrow-backed strings with NaN semantics so boolean masks stay plain numpy bools
+STRING_DTYPE = pd.StringDtype("pyarrow_numpy")
+
+# Column descriptions, including the compact "dtype" each column is loaded with
+SCHEMA_PATH = "docs/wells_schema.json"
+
+# Set WELL_EXPLORER_COMPACT_DTYPES=0 to load every column with its stored type
+COMPACT_DTYPES = os.environ.get("WELL_EXPLORER_COMPACT_DTYPES", "1") != "0"
+
+# Narrowest first; 'integer' columns get the first that holds their range
+_INTEGER_TYPES = [pa.int8(), pa.int16(), pa.int32(), pa.int64()]
+
+# Narrow integer columns load as nullable pandas integers, so nulls survive
+_NULLABLE_INTEGERS = {pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype()}
+
+# Copy-on-write lets every consumer get its own DataFrame object that shares the
+# store's buffers; writes (including column renames) never leak back into the store.
+pd.set_option("mode.copy_on_write", True)
+
+# path -> DataFrame holding every column loaded from that file so far
+_frames = {}
+# path -> version stamp of the file contents held in _frames
+_versions = {}
+_dtypes = None
+_lock = threading.RLock()
+
+
+def _types_mapper(arrow_type):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return STRING_DTYPE
+    return None
+
+
+def _compact_types_mapper(arrow_type):
+    return _NULLABLE_INTEGERS.get(arrow_type) or _types_mapper(arrow_type)
+
+
+def _normalize(name):
+    return name.lower().strip()
+
+
+def _shared_table(path):
+    """The copy of path published in shared memory (see shared_store), or None."""
+    from shared_store import shared_table
+    return shared_table(path, _file_version(path))
+
+
+def _schema_columns(path):
+    """Map normalized column names to the names stored in a parquet file (or its shared copy)."""
+    shared = _shared_table(path)
+    names = shared.column_names if shared is not None else pq.read_schema(path).names
+    return {_normalize(name): name for name in names}
+
+
+def _file_version(path):
+    stat = os.stat(path)
+    return f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def dataset_version(path=WELLS_PATH):
+    """Return a stamp identifying the loaded contents of a dataset file.
+
+    Caches built from a dataset should key on this so they are invalidated
+    whenever the store is reloaded from a changed file.
+    """
+    with _lock:
+        if path not in _versions:
+            return _file_version(path)
+        return _versions[path]
+
+
+def schema_dtypes(path=SCHEMA_PATH):
+    """Normalized column name -> compact dtype ('float32', 'category' or 'integer') from the schema."""
+    global _dtypes
+    with _lock:
+        if _dtypes is None:
+            with open(path) as f:
+                _dtypes = {_normalize(entry["name"]): entry["dtype"] for entry in json.load(f) if "dtype" in entry}
+        return _dtypes
+
+
+def _narrow_integer(column):
+    """column cast to the narrowest integer type holding its values (unchanged if some are fractional)."""
+    if pa.types.is_floating(column.type):
+        valid = column.drop_null()
+        valid = valid.filter(pc.invert(pc.is_nan(valid)))
+        if not pc.all(pc.equal(valid, pc.floor(valid))).as_py():
+            return column
+        column = pc.if_else(pc.is_nan(column), None, column)
+    bounds = pc.min_max(column)
+    lo, hi = bounds['min'].as_py(), bounds['max'].as_py()
+    for int_type in _INTEGER_TYPES:
+        info = np.iinfo(int_type.to_pandas_dtype())
+        if lo is None or (info.min <= lo and hi <= info.max):
+            return column.cast(int_type)
+    return column
+
+
+def _sorted_dictionary(column):
+    """Dictionary-encode a string column with sorted values, so categories order like the strings."""
+    dictionary = pc.unique(column).drop_null()
+    dictionary = dictionary.take(pc.sort_indices(dictionary))
+    index_type = next(t for t in _INTEGER_TYPES if len(dictionary) <= np.iinfo(t.to_pandas_dtype()).max)
+    return pa.chunked_array([pa.DictionaryArray.from_arrays(pc.index_in(chunk, value_set=dictionary).cast(index_type),
+                                                            dictionary)
+                             for chunk in column.chunks],
+                            type=pa.dictionary(index_type, dictionary.type))
+
+
+def compact_table(table, dtypes=None):
+    """Cast the columns of table to the compact types named in the schema.
+
+    'float32' columns become float32, 'category' string columns are
+    dictionary-encoded (pandas categoricals) and 'integer' columns get the
+    narrowest integer type holding their range (nullable in pandas). Columns
+    the schema does not mention keep their stored type.
+    """
+    dtypes = schema_dtypes() if dtypes is None else dtypes
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        dtype = dtypes.get(_normalize(name))
+        numeric = pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+        if dtype == 'float32' and numeric:
+            column = column.cast(pa.float32())
+        elif dtype == 'category' and (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+            column = _sorted_dictionary(column)
+        elif dtype == 'integer' and numeric:
+            column = _narrow_integer(column)
+        columns.append(column)
+    return pa.table(columns, names=table.column_names)
+
+
+def table_to_frame(table, compact=None):
+    """Convert an Arrow table to pandas the way the store does (normalized names, Arrow strings).
+
+    With compact (default: COMPACT_DTYPES) columns get the schema's compact dtypes, see compact_table.
+    """
+    compact = COMPACT_DTYPES if compact is None else compact
+    if compact:
+        table = compact_table(table)
+    frame = table.to_pandas(types_mapper=_compact_types_mapper if compact else _types_mapper,
+                            split_blocks=True, self_destruct=True)
+    frame.columns = [_normalize(c) for c in frame.columns]
+    return frame
+
+
+def _load_columns(path, columns):
+    """Read any of `columns` not yet held for `path` and return the shared frame."""
+    with _lock:
+        frame = _frames.get(path)
+        loaded = set(frame.columns) if frame is not None else set()
+        available = _schema_columns(path)
+        missing = [c for c in dict.fromkeys(columns) if c not in loaded and c in available]
+        if missing:
+            if frame is None:
+                _versions[path] = _file_version(path)
+            shared = _shared_table(path)
+            if shared is not None:
+                # Zero-copy columns over the shared memory map
+                table = shared.select([available[c] for c in missing])
+            else:
+                table = pq.read_table(path, columns=[available[c] for c in missing], memory_map=True)
+            new = table_to_frame(table)
+            frame = new if frame is None else pd.concat([frame, new], axis=1)
+            _frames[path] = frame
+        return frame
+
+
+@timed
+def read_dataset(path, columns=None):
+    """Return a read-only, zero-copy projection of a parquet file.
+
+    Each column is read from disk at most once per process. Column names are
+    lower-cased and stripped.
+    """
+    available = list(_schema_columns(path))
+    columns = available if columns is None else list(columns)
+    unknown = [c for c in columns if c not in available]
+    if unknown:
+        raise KeyError(f"Columns not found in {path}: {unknown}")
+    return _load_columns(path, columns)[columns]
+
+
+def get_metadata(columns=None):
+    """Return the well metadata table (see read_dataset)."""
+    return read_dataset(METADATA_PATH, columns)
+
+
+@timed
+def get_wells(columns=None):
+    """Return the wells table with 'x'/'y' coordinates and the joined 'water_use' column.
+
+    Like read_dataset, the result shares memory with the process-wide store and
+    only the requested columns are ever read from disk.
+    """
+    stored = list(_schema_columns(WELLS_PATH))
+    extra = [c for c in list(DERIVED_WELL_COLUMNS) + JOINED_METADATA_COLUMNS if c not in stored]
+    available = stored + extra
+    columns = available if columns is None else list(columns)
+    unknown = [c for c in columns if c not in available]
+    if unknown:
+        raise KeyError(f"Columns not found in {WELLS_PATH}: {unknown}")
+
+    base = [c for c in columns if c in stored]
+    base += [DERIVED_WELL_COLUMNS[c] for c in columns if c in extra and c in DERIVED_WELL_COLUMNS]
+    joined = [c for c in columns if c in extra and c in JOINED_METADATA_COLUMNS]
+    if joined:
+        base.append('objectid')
+
+    with _lock:
+        frame = _load_columns(WELLS_PATH, base)
+        added = {}
+        for alias, source in DERIVED_WELL_COLUMNS.items():
+            if alias in columns and alias not in frame.columns:
+                added[alias] = frame[source]
+        pending = [c for c in joined if c not in frame.columns]
+        if pending:
+            lookup = get_metadata(['objectid'] + pending).set_index('objectid')
+            for col in pending:
+                added[col] = frame['objectid'].map(lookup[col]).astype(lookup[col].dtype)
+        if added:
+            frame = frame.assign(**added)
+            _frames[WELLS_PATH] = frame
+    return frame[columns]
+
+
+def clear_datasets():
+    """Drop every loaded dataset so the next access re-reads from disk."""
+    with _lock:
+        _frames.clear()
+        _versions.clear()
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+# Default number of points sent to the browser in level-of-detail mode
+DEFAULT_POINT_BUDGET = 20000
+
+# Zoom level at which the map switches from density cells to individual wells
+DETAIL_ZOOM = 9
+
+# Approximate screen size (pixels) of one density cell on the map
+CELL_PIXELS = 16
+
+
+def _grid_cells(x, y, n_side):
+    """Assign each point to a cell of an n_side x n_side grid over its bounding box."""
+    x0, x1 = np.nanmin(x), np.nanmax(x)
+    y0, y1 = np.nanmin(y), np.nanmax(y)
+    ix = np.clip(((x - x0) / ((x1 - x0) or 1.0) * n_side).astype(np.int64), 0, n_side - 1)
+    iy = np.clip(((y - y0) / ((y1 - y0) or 1.0) * n_side).astype(np.int64), 0, n_side - 1)
+    return ix * n_side + iy
+
+
+def decimate_points(df, budget, x_col='x', y_col='y', stratify_col=None):
+    """Reduce df to at most ~budget rows by spatial binning.
+
+    One row is kept per (stratum, grid cell), so every value of stratify_col
+    keeps at least one point in every cell it occupies and small groups stay
+    visible. The finest grid that fits the budget is used; if the strata alone
+    exceed it, one point per stratum is kept.
+
+    Returns (decimated_df, hidden_count).
+    """
+    if budget is None:
+        return df, 0
+    df = df.dropna(subset=[x_col, y_col])
+    if len(df) <= budget:
+        return df, 0
+
+    x = df[x_col].to_numpy(dtype=float)
+    y = df[y_col].to_numpy(dtype=float)
+    if stratify_col is not None:
+        strata = pd.Categorical(df[stratify_col]).codes.astype(np.int64) + 1
+    else:
+        strata = np.zeros(len(df), dtype=np.int64)
+
+    def first_per_cell(n_side):
+        keys = strata * (n_side * n_side) + _grid_cells(x, y, n_side)
+        return np.unique(keys, return_index=True)[1]
+
+    # Binary search for the finest grid whose occupied (stratum, cell) pairs fit the budget
+    first = first_per_cell(1)
+    lo, hi = 2, max(int(np.sqrt(len(df))) * 4, 2)
+    while lo <= hi:
+        n_side = (lo + hi) // 2
+        candidate = first_per_cell(n_side)
+        if len(candidate) <= budget:
+            first, lo = candidate, n_side + 1
+        else:
+            hi = n_side - 1
+
+    kept = df.iloc[np.sort(first)]
+    return kept, len(df) - len(kept)
+
+
+def cell_size_for_zoom(zoom):
+    """Density cell size in degrees for a mapbox zoom level."""
+    return 360.0 / (256 * 2 ** zoom) * CELL_PIXELS
+
+
+def density_cells(x, y, cell_size):
+    """Aggregate points into square cells of cell_size degrees.
+
+    Returns a DataFrame with the mean 'x'/'y' of the wells in each occupied
+    cell and their 'count'.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    if len(x) == 0:
+        return pd.DataFrame({'x': [], 'y': [], 'count': []})
+    ix = np.floor((x - x.min()) / cell_size).astype(np.int64)
+    iy = np.floor((y - y.min()) / cell_size).astype(np.int64)
+    keys = ix * (iy.max() + 1) + iy
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return pd.DataFrame({
+        'x': np.bincount(inverse, weights=x) / counts,
+        'y': np.bincount(inverse, weights=y) / counts,
+        'count': counts,
+    })
+
+
+def hidden_points(fig):
+    """Number of points a figure left out in level-of-detail mode (0 if none)."""
+    meta = fig.layout.meta
+    return meta.get('hidden_points', 0) if isinstance(meta, dict) else 0
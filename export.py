@@ -0,0 +1,188 @@
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import streamlit as st
+from profiling import timed
+
+from datasets import dataset_version, get_metadata, get_wells
+from well_functions import select_group
+
+EXPORT_FORMATS = {
+    "CSV": {"extension": "csv", "mime": "text/csv"},
+    "Parquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"},
+    "GeoParquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+COMPRESSIONS = {"none": None, "gzip": "gzip", "zstd": "zstd"}
+COMPRESSED_EXTENSIONS = {"gzip": "gz", "zstd": "zst"}
+
+# Rows converted and written per record batch
+BATCH_ROWS = 65536
+
+# Upper bound on the total size of cached export files
+EXPORT_CACHE_BYTES = 256 * 1024 * 1024
+
+_export_cache = OrderedDict()
+_cache_bytes = 0
+_lock = threading.Lock()
+
+
+def _point_wkb(x, y):
+    """Encode x/y arrays as little-endian WKB points without a geometry library."""
+    wkb = np.empty(len(x), dtype=[('order', 'u1'), ('type', '<u4'), ('x', '<f8'), ('y', '<f8')])
+    wkb['order'] = 1
+    wkb['type'] = 1
+    wkb['x'] = x
+    wkb['y'] = y
+    offsets = np.arange(len(x) + 1, dtype=np.int32) * wkb.itemsize
+    return pa.BinaryArray.from_buffers(pa.binary(), len(x), [None, pa.py_buffer(offsets), pa.py_buffer(wkb.tobytes())])
+
+
+def _geo_metadata():
+    return json.dumps({
+        "version": "1.0.0",
+        "primary_column": "geometry",
+        "columns": {"geometry": {"encoding": "WKB", "geometry_types": ["Point"], "crs": "EPSG:4326"}},
+    }).encode()
+
+
+def _export_frame(group_col, selected_group, columns, metadata_columns, geometry=False, filters=None):
+    """Return the rows and columns to export, with metadata columns joined by objectid.
+
+    With filters (a query.WellFilter) only the matching wells are exported,
+    as on the page.
+    """
+    needed = list(dict.fromkeys(list(columns) + ([group_col] if group_col else []) + (['x', 'y'] if geometry else [])))
+    if metadata_columns:
+        needed = list(dict.fromkeys(needed + ['objectid']))
+    if filters:
+        from query import run_query
+        frame = run_query(filters, needed)
+    else:
+        frame = get_wells(needed)
+    frame = select_group(frame, group_col, selected_group)
+    if metadata_columns:
+        meta = get_metadata(['objectid'] + [c for c in metadata_columns if c != 'objectid'])
+        frame = frame.merge(meta, on='objectid', how='left', suffixes=('', '_metadata'))
+    output_columns = list(dict.fromkeys(list(columns) + [c for c in metadata_columns if c != 'objectid']))
+    return frame, output_columns
+
+
+def iter_record_batches(frame, columns, geometry=False, batch_rows=BATCH_ROWS):
+    """Yield the frame as Arrow record batches of at most batch_rows rows."""
+    schema = None
+    for start in range(0, max(len(frame), 1), batch_rows):
+        chunk = frame.iloc[start:start + batch_rows]
+        batch = pa.RecordBatch.from_pandas(chunk[columns], preserve_index=False)
+        if geometry:
+            batch = batch.append_column("geometry", _point_wkb(chunk['x'].to_numpy(dtype=float), chunk['y'].to_numpy(dtype=float)))
+        if schema is None:
+            schema = batch.schema
+        yield batch.cast(schema) if batch.schema != schema else batch
+
+
+@timed
+def write_export(frame, columns, fmt="CSV", compression=None, batch_rows=BATCH_ROWS):
+    """Stream the export to an in-memory buffer batch by batch and return its bytes."""
+    geometry = fmt == "GeoParquet"
+    sink = pa.BufferOutputStream()
+    batches = iter_record_batches(frame, columns, geometry=geometry, batch_rows=batch_rows)
+    first = next(batches)
+
+    if fmt == "CSV":
+        # Second-resolution timestamps keep the text free of trailing nanoseconds
+        schema = pa.schema([pa.field(f.name, pa.timestamp('s') if pa.types.is_timestamp(f.type) else f.type)
+                            for f in first.schema])
+        stream = pa.CompressedOutputStream(sink, compression) if compression else sink
+        with pacsv.CSVWriter(stream, schema) as writer:
+            writer.write_batch(first.cast(schema))
+            for batch in batches:
+                writer.write_batch(batch.cast(schema))
+        if compression:
+            stream.close()
+    else:
+        schema = first.schema
+        if geometry:
+            schema = schema.with_metadata({**(schema.metadata or {}), b"geo": _geo_metadata()})
+        with pq.ParquetWriter(sink, schema, compression=compression or "none", write_statistics=True) as writer:
+            writer.write_batch(first.replace_schema_metadata(schema.metadata))
+            for batch in batches:
+                writer.write_batch(batch.replace_schema_metadata(schema.metadata))
+    return sink.getvalue().to_pybytes()
+
+
+def export_file_name(selected_group, fmt="CSV", compression=None):
+    file_safe_group = selected_group.replace(" ", "_").lower() if selected_group else "all"
+    name = f"filtered_wells_{file_safe_group}.{EXPORT_FORMATS[fmt]['extension']}"
+    if fmt == "CSV" and compression:
+        name += f".{COMPRESSED_EXTENSIONS[compression]}"
+    return name
+
+
+def get_export(group_col, selected_group, columns, metadata_columns=(), fmt="CSV", compression=None, filters=None):
+    """Return the export bytes, building them only on a cache miss."""
+    global _cache_bytes
+    if filters:
+        from query import source_version
+        version = source_version()
+    else:
+        version = dataset_version()
+    key = (version, filters or None, group_col, (selected_group or "").strip().lower(),
+           tuple(columns), tuple(metadata_columns), fmt, compression)
+    with _lock:
+        if key in _export_cache:
+            _export_cache.move_to_end(key)
+            return _export_cache[key]
+
+    frame, output_columns = _export_frame(group_col, selected_group, columns, metadata_columns,
+                                          geometry=fmt == "GeoParquet", filters=filters)
+    data = write_export(frame, output_columns, fmt=fmt, compression=compression)
+
+    with _lock:
+        if key not in _export_cache:
+            _export_cache[key] = data
+            _cache_bytes += len(data)
+            while _cache_bytes > EXPORT_CACHE_BYTES and len(_export_cache) > 1:
+                _, evicted = _export_cache.popitem(last=False)
+                _cache_bytes -= len(evicted)
+    return data
+
+
+def render_export_ui(selected_group, group_col, filters=None):
+    """Streamlit UI for building and downloading the filtered wells (narrowed by the attribute filters)."""
+    st.markdown("### Download Filtered Data")
+
+    well_columns = list(get_wells().columns)
+    metadata_columns = [c for c in get_metadata().columns if c != 'objectid']
+
+    col1, col2 = st.columns(2)
+    with col1:
+        fmt = st.selectbox("Format", list(EXPORT_FORMATS))
+        compression = COMPRESSIONS[st.selectbox("Compression", list(COMPRESSIONS))]
+    with col2:
+        columns = st.multiselect("Well columns", well_columns, default=well_columns)
+        extra_columns = st.multiselect("Metadata columns", metadata_columns)
+
+    if not columns and not extra_columns:
+        st.info("Select at least one column to export.")
+        return
+
+    request = (group_col, selected_group, tuple(columns), tuple(extra_columns), fmt, compression, filters or None)
+    if st.button("Prepare download"):
+        st.session_state["export_request"] = request
+
+    # The file is only built once the user has asked for it with these settings
+    if st.session_state.get("export_request") == request:
+        with st.spinner("Building file..."):
+            data = get_export(group_col, selected_group, columns, extra_columns, fmt=fmt, compression=compression,
+                              filters=filters)
+        st.download_button(
+            label=f"⬇️ Download {fmt}",
+            data=data,
+            file_name=export_file_name(selected_group, fmt, compression),
+            mime=EXPORT_FORMATS[fmt]["mime"] if not (fmt == "CSV" and compression) else "application/octet-stream"
+        )
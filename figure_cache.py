@@ -0,0 +1,126 @@
+import functools
+import inspect
+import threading
+from collections import OrderedDict
+
+# Bounds on the shared figure cache (whichever is hit first evicts the oldest entry)
+FIGURE_CACHE_ENTRIES = 256
+FIGURE_CACHE_BYTES = 256 * 1024 * 1024
+
+# (dataset version, plot kind, arguments) -> serialized figure JSON
+_figures = OrderedDict()
+_cache_bytes = 0
+_version = None
+_hits = 0
+_misses = 0
+_lock = threading.Lock()
+
+
+def _store(key, spec):
+    global _cache_bytes
+    if key in _figures:
+        return
+    _figures[key] = spec
+    _cache_bytes += len(spec)
+    while len(_figures) > 1 and (len(_figures) > FIGURE_CACHE_ENTRIES or _cache_bytes > FIGURE_CACHE_BYTES):
+        _, evicted = _figures.popitem(last=False)
+        _cache_bytes -= len(evicted)
+
+
+def get_figure(kind, key, build):
+    """Return the figure for (kind, key), calling build() only on a cache miss.
+
+    Figures are held as serialized JSON, so every caller gets its own Figure
+    object and a hit costs one deserialization instead of a rebuild. Entries
+    for an older dataset version are dropped on the next lookup.
+    """
+    import plotly.io as pio
+    from datasets import dataset_version
+
+    global _version, _cache_bytes, _hits, _misses
+    version = dataset_version()
+    full_key = (version, kind, key)
+    with _lock:
+        if version != _version:
+            _figures.clear()
+            _cache_bytes = 0
+            _version = version
+        spec = _figures.get(full_key)
+        if spec is not None:
+            _figures.move_to_end(full_key)
+            _hits += 1
+        else:
+            _misses += 1
+    if spec is not None:
+        return pio.from_json(spec)
+
+    fig = build()
+    spec = fig.to_json()
+    with _lock:
+        if version == _version:
+            _store(full_key, spec)
+    return fig
+
+
+def cached_figure(kind, frame_token=None, version=None):
+    """Decorator caching a plot function's figure on its (normalized) arguments.
+
+    DataFrame arguments are keyed with frame_token(frame); calls where it
+    returns None (or no frame_token is given) bypass the cache. Arguments named
+    selected_group are compared ignoring case and surrounding spaces. Calls
+    with a non-empty filters argument (a query.WellFilter) are also keyed on
+    query.source_version(), the version of the data the filters read. Figures
+    built from other data files can pass version, a callable whose stamp is
+    added to the key.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Imported on first call so decorating a plot function stays cheap
+            import pandas as pd
+            from group_index import normalize_group
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            parts = []
+            filtered = False
+            for name, value in bound.arguments.items():
+                if isinstance(value, pd.DataFrame):
+                    value = frame_token(value) if frame_token else None
+                    if value is None:
+                        return func(*args, **kwargs)
+                elif name == 'selected_group' and value:
+                    value = normalize_group(value)
+                elif name == 'filters' and value:
+                    filtered = True
+                parts.append((name, value))
+            if filtered:
+                from query import source_version
+                parts.append(('source', source_version()))
+            if version is not None:
+                parts.append(('version', version()))
+            key = tuple(parts)
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            return get_figure(kind, key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def cache_info():
+    """Hit/miss counters and current size of the figure cache."""
+    with _lock:
+        return {"hits": _hits, "misses": _misses, "entries": len(_figures), "bytes": _cache_bytes}
+
+
+def clear_figure_cache():
+    global _cache_bytes, _hits, _misses
+    with _lock:
+        _figures.clear()
+        _cache_bytes = 0
+        _hits = 0
+        _misses = 0
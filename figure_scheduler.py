@@ -0,0 +1,92 @@
+"""
+Concurrent figure building for one run of the app.
+
+Each chart reserves its place on the page when it is submitted: a container
+with a "Building ..." caption. The figure is then built on a thread pool
+shared by all sessions. FigureScheduler.render() runs on the script thread
+and draws each chart into its container as soon as it is ready. The page
+therefore shows the cheapest chart first and no longer waits for the sum of
+all the builds.
+
+A thread pool fits better than a process pool here because the builders
+share the process-wide dataset, group index, summary tables and figure
+cache. The heavy parts (pandas, Arrow, numpy) release the GIL.
+
+While a profiling run is active, builds run one at a time on the script
+thread so the profiler's call tree stays correct.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from profiling import current_run
+
+# Figures built at once across all sessions
+RENDER_WORKERS = int(os.environ.get("WELL_EXPLORER_RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="figure")
+        return _executor
+
+
+class FigureScheduler:
+    """Figures of one script run, built concurrently and drawn into their reserved containers."""
+
+    def __init__(self):
+        self._tasks = []
+        self.timings = {}
+        self._started = time.perf_counter()
+
+    def submit(self, label, build, render):
+        """Reserve a container here and start build(); render(figure) draws it later inside the container.
+
+        build must not call Streamlit. render runs on the script thread and may
+        create widgets.
+        """
+        import streamlit as st
+        container = st.container()
+        slot = container.empty()
+        slot.caption(f"Building {label.lower()}...")
+        inline = current_run() is not None
+        future = None if inline else _get_executor().submit(build)
+        self._tasks.append({'label': label, 'build': build, 'render': render, 'container': container,
+                            'slot': slot, 'future': future})
+
+    def _draw(self, task, figure=None, error=None):
+        task['slot'].empty()
+        with task['container']:
+            if error is not None:
+                import streamlit as st
+                st.error(f"Could not build the {task['label'].lower()}: {error}")
+            else:
+                task['render'](figure)
+        self.timings[task['label']] = round(time.perf_counter() - self._started, 3)
+
+    def render(self):
+        """Draw every submitted figure as it completes; returns once all are drawn."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            if task['future'] is None:
+                try:
+                    figure = task['build']()
+                except Exception as exc:
+                    self._draw(task, error=exc)
+                else:
+                    self._draw(task, figure)
+
+        pending = {task['future']: task for task in tasks if task['future'] is not None}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            # Submission order among figures that finished together keeps the page stable
+            for future in sorted(done, key=lambda f: tasks.index(pending[f])):
+                task = pending.pop(future)
+                error = future.exception()
+                self._draw(task, None if error else future.result(), error)
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+
+def normalize_group(value):
+    """Normalize a group label the way the group index stores it."""
+    return str(value).strip().lower()
+
+
+def normalized_categorical(values):
+    """Categorical of the stripped, lower-cased values of a column.
+
+    Categorical columns only normalize their categories; their codes are
+    remapped since different spellings can normalize to the same group.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        normalized = pd.Categorical(values.cat.categories.astype(str).str.strip().str.lower())
+        codes = values.cat.codes.to_numpy()
+        remapped = np.where(codes >= 0, normalized.codes[codes], -1)
+        # Drop groups that no row uses, like pd.Categorical(values) would
+        valid = remapped >= 0
+        used, inverse = np.unique(remapped[valid], return_inverse=True)
+        codes = np.full(len(remapped), -1, dtype=np.int64)
+        codes[valid] = inverse
+        return pd.Categorical.from_codes(codes, normalized.categories[used])
+    return pd.Categorical(values.str.strip().str.lower())
+
+
+class GroupIndex:
+    """Row positions of every group in a set of categorical columns.
+
+    Each column is normalized once (stripped, lower-cased) into a pandas
+    Categorical. Rows are then sorted by category code so the positions of any
+    group are a contiguous slice, which makes selecting a group an O(group size)
+    take instead of a full-table string comparison.
+    """
+
+    def __init__(self, df, columns, key_col='objectid'):
+        self.size = len(df)
+        self.columns = [c for c in columns if c in df.columns]
+        self._key = df[key_col].to_numpy() if key_col in df.columns else None
+        self._key_col = key_col
+        self._categoricals = {}
+        self._lookup = {}
+        self._order = {}
+        self._offsets = {}
+
+        position_dtype = np.int32 if self.size < 2 ** 31 else np.int64
+        for col in self.columns:
+            cat = normalized_categorical(df[col])
+            codes = cat.codes
+            # Stable sort keeps positions ascending within a group; NaN (-1) sorts first
+            order = np.argsort(codes, kind='stable').astype(position_dtype)
+            counts = np.bincount(codes[codes >= 0], minlength=len(cat.categories))
+            offsets = np.concatenate([[0], np.cumsum(counts)]) + np.count_nonzero(codes < 0)
+
+            self._categoricals[col] = cat
+            self._lookup[col] = {name: code for code, name in enumerate(cat.categories)}
+            self._order[col] = order
+            self._offsets[col] = offsets
+
+    def categorical(self, col):
+        """Return the normalized Categorical for a column."""
+        return self._categoricals[col]
+
+    def groups(self, col):
+        """Return the normalized group names of a column."""
+        return list(self._categoricals[col].categories)
+
+    def positions(self, col, group):
+        """Return the ascending row positions of `group` in `col` (empty if unknown)."""
+        code = self._lookup[col].get(normalize_group(group))
+        if code is None:
+            return self._order[col][:0]
+        offsets = self._offsets[col]
+        return self._order[col][offsets[code]:offsets[code + 1]]
+
+    def group_sizes(self, col):
+        """Return a Series of row counts per normalized group."""
+        return pd.Series(np.diff(self._offsets[col]), index=self._categoricals[col].categories)
+
+    def covers(self, df):
+        """True if df is a view of the frame this index was built from."""
+        if self._key is None or len(df) != self.size or self._key_col not in df.columns:
+            return False
+        key = df[self._key_col].to_numpy()
+        return key.shape == self._key.shape and np.may_share_memory(key, self._key)
+
+    def take(self, df, col, group):
+        """Return the rows of df belonging to `group` in `col`."""
+        return df.take(self.positions(col, group))
@@ -0,0 +1,165 @@
+"""
+Hexagonal binning of wells for statewide map views.
+
+Wells are assigned to pointy-top hexagons on an equirectangular plane
+(longitudes scaled by the cosine of REFERENCE_LATITUDE so the cells look
+regular over Arizona). Per cell the well count and the mean, median and
+percentiles of every value column are computed with sorted, segmented numpy
+reductions. There is no per-cell Python loop.
+
+The pyramid over the shared dataset (one table per level in HEX_SIZES) is
+built once per dataset version and memoized, like the summary tables in
+stats_engine.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Circumradius in degrees of the hexagons at each pyramid level (coarsest first)
+HEX_SIZES = [0.8, 0.4, 0.2, 0.1, 0.05, 0.025]
+
+# Latitude at which hexagons are drawn regular (central Arizona)
+REFERENCE_LATITUDE = 34.0
+
+# Screen radius (pixels) a hexagon should have when its level is picked from the zoom
+HEX_PIXELS = 6
+
+# Columns aggregated per cell besides the well count
+HEX_VALUE_COLUMNS = ['well_depth', 'wl_dtw', 'wl_elev']
+
+# Statistics computed per cell for every value column
+HEX_QUANTILES = {'p10': 0.1, 'p25': 0.25, 'median': 0.5, 'p75': 0.75, 'p90': 0.9}
+HEX_STATS = ['mean'] + list(HEX_QUANTILES)
+
+# Coordinate precision of the GeoJSON cell outlines (about 10 m)
+GEOJSON_DECIMALS = 4
+
+_SQRT3 = np.sqrt(3.0)
+
+# (dataset version, value columns) -> {level: cells}
+_pyramids = {}
+_lock = threading.Lock()
+
+
+def _scale():
+    return np.cos(np.radians(REFERENCE_LATITUDE))
+
+
+def hex_coordinates(x, y, size):
+    """Axial (q, r) coordinates of the hexagon of circumradius size containing each point."""
+    px = np.asarray(x, dtype=float) * _scale() / size
+    py = np.asarray(y, dtype=float) / size
+    q = _SQRT3 / 3 * px - py / 3
+    r = 2 / 3 * py
+    # Round in cube coordinates, then fix the component with the largest rounding error
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def hex_centers(q, r, size):
+    """Longitude/latitude of the centers of axial hexagons."""
+    cx = size * _SQRT3 * (np.asarray(q) + np.asarray(r) / 2)
+    cy = size * 1.5 * np.asarray(r)
+    return cx / _scale(), cy
+
+
+def _segment_quantiles(values, starts, counts, quantile):
+    """Quantile (linear interpolation, like pandas) of each sorted segment of values; NaN if empty."""
+    position = quantile * np.maximum(counts - 1, 0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+    frac = position - lower
+    if len(values) == 0:
+        return np.full(len(counts), np.nan)
+    at_lower = values[np.where(counts > 0, starts + lower, 0)]
+    at_upper = values[np.where(counts > 0, starts + upper, 0)]
+    return np.where(counts > 0, at_lower * (1 - frac) + at_upper * frac, np.nan)
+
+
+def aggregate_hexes(x, y, values, size):
+    """Aggregate points into hexagons of circumradius size.
+
+    values maps column names to arrays aligned with x/y. Returns a frame with
+    one row per occupied cell: axial 'q'/'r', center 'lon'/'lat', well
+    'count', and '<column>_<stat>' for every stat in HEX_STATS.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    located = ~(np.isnan(x) | np.isnan(y))
+    q, r = hex_coordinates(x[located], y[located], size)
+    cells, codes = np.unique(np.column_stack([q, r]), axis=0, return_inverse=True)
+    codes = codes.ravel()
+    n_cells = len(cells)
+    lon, lat = hex_centers(cells[:, 0], cells[:, 1], size)
+    result = {'q': cells[:, 0], 'r': cells[:, 1], 'lon': lon, 'lat': lat,
+              'count': np.bincount(codes, minlength=n_cells)}
+
+    for col, column in values.items():
+        column = np.asarray(column, dtype=float)[located]
+        valid = ~np.isnan(column)
+        col_codes, col_values = codes[valid], column[valid]
+        # One sort by (cell, value) serves every quantile of this column
+        order = np.lexsort((col_values, col_codes))
+        sorted_values = col_values[order]
+        counts = np.bincount(col_codes, minlength=n_cells)
+        starts = np.cumsum(counts) - counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[f"{col}_mean"] = np.bincount(col_codes, weights=col_values, minlength=n_cells) / counts
+        for stat, quantile in HEX_QUANTILES.items():
+            result[f"{col}_{stat}"] = _segment_quantiles(sorted_values, starts, counts, quantile)
+    return pd.DataFrame(result)
+
+
+def hex_level_for_zoom(zoom):
+    """Pyramid level whose hexagons are closest to HEX_PIXELS across at a mapbox zoom level."""
+    pixels_per_degree = 256 * 2 ** zoom / 360.0
+    sizes = np.asarray(HEX_SIZES) * pixels_per_degree
+    return int(np.argmin(np.abs(np.log(sizes / HEX_PIXELS))))
+
+
+def get_hex_pyramid(df, value_cols, version):
+    """Return {level: cells} of df for every level in HEX_SIZES, memoized per dataset version.
+
+    Only pass the shared dataset with its dataset_version; other frames
+    should be aggregated directly with aggregate_hexes.
+    """
+    key = (version, tuple(value_cols))
+    with _lock:
+        pyramid = _pyramids.get(key)
+    if pyramid is None:
+        x, y = df['x'].to_numpy(dtype=float), df['y'].to_numpy(dtype=float)
+        values = {col: df[col].to_numpy(dtype=float) for col in value_cols}
+        pyramid = {level: aggregate_hexes(x, y, values, size) for level, size in enumerate(HEX_SIZES)}
+        with _lock:
+            _pyramids[key] = pyramid
+    return pyramid
+
+
+def hex_geojson(cells, size):
+    """GeoJSON FeatureCollection of the outlines of cells (feature ids are 'q,r')."""
+    angles = np.radians(30 + 60 * np.arange(7))
+    lon = cells['lon'].to_numpy()[:, None] + size * np.cos(angles)[None, :] / _scale()
+    lat = cells['lat'].to_numpy()[:, None] + size * np.sin(angles)[None, :]
+    rings = np.round(np.stack([lon, lat], axis=-1), GEOJSON_DECIMALS).tolist()
+    ids = hex_ids(cells)
+    return {"type": "FeatureCollection",
+            "features": [{"type": "Feature", "id": cell_id, "properties": {},
+                          "geometry": {"type": "Polygon", "coordinates": [ring]}}
+                         for cell_id, ring in zip(ids, rings)]}
+
+
+def hex_ids(cells):
+    """Feature id of each cell, matching hex_geojson."""
+    return (cells['q'].astype(str) + "," + cells['r'].astype(str)).tolist()
+
+
+def clear_hex_cache():
+    with _lock:
+        _pyramids.clear()
@@ -0,0 +1,268 @@
+"""
+Chunked, incremental ingest of the GWSI wells extract.
+
+Scriptable replacement for import_wells_csv_clean_data.ipynb. The source
+CSV (or Parquet) is read in chunks with explicit dtypes and cleaned the same
+way the notebook did. Clean rows and metadata are then upserted on OBJECTID
+into Parquet datasets partitioned by BASIN_NAME_1, so a refresh only
+rewrites the partitions whose rows actually changed. Peak memory is about
+one chunk plus the largest partition.
+
+Usage:
+    python ingest.py GWSI_2024_wells_enriched.csv [--out data] [--flat] [--delete-missing]
+"""
+import argparse
+import os
+import shutil
+import time
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+JOIN_FIELD = 'OBJECTID'
+PARTITION_COLUMN = 'BASIN_NAME_1'
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+MIN_WELL_DEPTH = 0.5
+DATE_COLUMNS = ['DRILL_DATE', 'LASTWLDATE']
+NUMERIC_COLUMNS = ['AGE_MIN', 'AGE_MAX']
+VALUE_COLUMNS = ['WELL_DEPTH', 'WL_DTW', 'WL_ELEV']
+REDUNDANT_COLUMNS = ['SUBBASIN_NAME_GWSI']
+COORDINATE_RENAMES = {'LATITUDE': 'DD_LAT', 'LONGITUDE': 'DD_LONG'}
+
+# Output schemas of the cleaned wells table and the metadata split off from it
+WELLS_SCHEMA = pa.schema([
+    ('OBJECTID', pa.int64()), ('DD_LAT', pa.float64()), ('DD_LONG', pa.float64()),
+    ('LAT_NAD27', pa.string()), ('LONG_NAD27', pa.string()), ('WELL_ALT', pa.int64()),
+    ('WELL_DEPTH', pa.int64()), ('WL_DTW', pa.float64()), ('WL_ELEV', pa.float64()),
+    ('DRILL_DATE', pa.timestamp('ns')), ('LASTWLDATE', pa.timestamp('ns')), ('FREQUENCY', pa.string()),
+    ('UNIT_NAME', pa.string()), ('AGE_MIN', pa.float64()), ('AGE_MAX', pa.float64()),
+    ('MAJOR1', pa.string()), ('MAJOR2', pa.string()), ('MAJOR3', pa.string()),
+    ('GENERALIZE', pa.string()), ('ROCK_NAME', pa.string()), ('AQ_NAME', pa.string()),
+    ('NAME_ABBR', pa.string()), ('BASIN_NAME_1', pa.string()), ('SUBBASIN_NAME', pa.string()),
+])
+METADATA_SCHEMA = pa.schema([
+    ('OBJECTID', pa.int64()), ('SITE_ID', pa.int64()), ('REG_ID', pa.string()),
+    ('WELL_TYPE', pa.string()), ('WATER_USE', pa.string()), ('CASE_DIAM', pa.int64()),
+    ('WL_COUNT', pa.int64()), ('DRILL_DA_1', pa.string()), ('LSTWLDT_TE', pa.string()),
+    ('SGMC_LABEL', pa.string()), ('UNIT_LINK', pa.string()), ('MINOR1', pa.string()),
+    ('MINOR2', pa.string()), ('MINOR3', pa.string()), ('ROCK_TYPE', pa.float64()),
+    ('NAME_ABBR_1', pa.string()), ('NAME_ABBR_12', pa.string()),
+])
+DATASETS = {'wells': WELLS_SCHEMA, 'metadata': METADATA_SCHEMA}
+FLAT_OUTPUTS = {'wells': 'wells_cleaned_main.parquet', 'metadata': 'wells_metadata.parquet'}
+
+CHUNK_ROWS = 100_000
+ROW_GROUP_ROWS = 50_000
+COMPRESSION = 'zstd'
+
+
+def _source_dtypes():
+    """Explicit pandas dtypes for the source columns, derived from the output schemas."""
+    dtypes = {}
+    for schema in DATASETS.values():
+        for field in schema:
+            if field.name in DATE_COLUMNS + NUMERIC_COLUMNS or pa.types.is_string(field.type):
+                dtypes[field.name] = 'string'
+            elif pa.types.is_integer(field.type):
+                dtypes[field.name] = 'Int64'
+            else:
+                dtypes[field.name] = 'float64'
+    for source, target in COORDINATE_RENAMES.items():
+        dtypes[source] = dtypes.pop(target)
+    for col in REDUNDANT_COLUMNS:
+        dtypes[col] = 'string'
+    return dtypes
+
+
+SOURCE_DTYPES = _source_dtypes()
+
+
+def iter_source_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield the source extract in DataFrame chunks with explicit dtypes."""
+    if path.lower().endswith('.parquet'):
+        source = pq.ParquetFile(path)
+        for batch in source.iter_batches(batch_size=chunk_rows):
+            chunk = batch.to_pandas()
+            yield chunk.astype({c: t for c, t in SOURCE_DTYPES.items() if c in chunk.columns})
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype=SOURCE_DTYPES)
+
+
+def clean_chunk(chunk):
+    """Apply the notebook's cleaning steps to one chunk.
+
+    Returns (wells, metadata) DataFrames matching WELLS_SCHEMA and METADATA_SCHEMA.
+    """
+    chunk = chunk[chunk['WELL_DEPTH'] >= MIN_WELL_DEPTH]
+    chunk = chunk.rename(columns=COORDINATE_RENAMES)
+    chunk = chunk.drop(columns=REDUNDANT_COLUMNS, errors='ignore')
+
+    for col in DATE_COLUMNS:
+        chunk[col] = pd.to_datetime(chunk[col], errors='coerce')
+    for col in NUMERIC_COLUMNS:
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+
+    chunk = chunk.dropna(subset=VALUE_COLUMNS)
+    wells = chunk.reindex(columns=WELLS_SCHEMA.names)
+    metadata = chunk.reindex(columns=METADATA_SCHEMA.names)
+    return wells, metadata
+
+
+def partition_key(values):
+    """Directory-safe partition keys for an array of partition column values."""
+    values = pd.Series(values, dtype=object)
+    return values.map(lambda v: NULL_PARTITION if pd.isna(v) or v == '' else quote(str(v), safe=''))
+
+
+def _partition_path(out, dataset, key):
+    return os.path.join(out, dataset, f"{PARTITION_COLUMN}={key}", "part-0.parquet")
+
+
+def _to_table(frame, schema):
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def _write_atomic(table, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_ROWS, compression=COMPRESSION,
+                   write_statistics=True)
+    os.replace(tmp_path, path)
+
+
+def _read_file(path):
+    # ParquetFile avoids pq.read_table's hive-partition inference from the directory name
+    return pq.ParquetFile(path).read()
+
+
+def _read_index(out):
+    path = os.path.join(out, "_index.parquet")
+    if not os.path.exists(path):
+        return pd.DataFrame({JOIN_FIELD: pd.Series(dtype='int64'), 'partition': pd.Series(dtype=object)})
+    return _read_file(path).to_pandas()
+
+
+def stage_source(path, out, chunk_rows=CHUNK_ROWS):
+    """Clean the source chunk by chunk into per-partition staging files.
+
+    Returns a DataFrame mapping every ingested OBJECTID to its partition key.
+    """
+    staging = os.path.join(out, "_staging")
+    shutil.rmtree(staging, ignore_errors=True)
+    assignments = []
+    for i, chunk in enumerate(iter_source_chunks(path, chunk_rows)):
+        wells, metadata = clean_chunk(chunk)
+        keys = partition_key(wells[PARTITION_COLUMN].to_numpy()).to_numpy()
+        assignments.append(pd.DataFrame({JOIN_FIELD: wells[JOIN_FIELD].to_numpy(dtype=np.int64), 'partition': keys}))
+        for dataset, frame in (('wells', wells), ('metadata', metadata)):
+            for key, part in frame.groupby(keys, sort=False):
+                part_path = os.path.join(staging, dataset, key, f"chunk-{i:05d}.parquet")
+                os.makedirs(os.path.dirname(part_path), exist_ok=True)
+                pq.write_table(_to_table(part, DATASETS[dataset]), part_path)
+    if not assignments:
+        return pd.DataFrame({JOIN_FIELD: pd.Series(dtype='int64'), 'partition': pd.Series(dtype=object)})
+    # Later chunks win if an OBJECTID appears more than once
+    return pd.concat(assignments).drop_duplicates(JOIN_FIELD, keep='last')
+
+
+def _merge_partition(out, dataset, key, drop_ids):
+    """Upsert staged rows into one partition; returns True if the partition was rewritten."""
+    schema = DATASETS[dataset]
+    path = _partition_path(out, dataset, key)
+    existing = _read_file(path).cast(schema) if os.path.exists(path) else schema.empty_table()
+
+    staged_dir = os.path.join(out, "_staging", dataset, key)
+    staged_files = sorted(os.listdir(staged_dir)) if os.path.isdir(staged_dir) else []
+    staged = pa.concat_tables([_read_file(os.path.join(staged_dir, f)) for f in staged_files]) \
+        if staged_files else schema.empty_table()
+    staged_frame = staged.to_pandas().drop_duplicates(JOIN_FIELD, keep='last')
+
+    existing_frame = existing.to_pandas()
+    replaced = np.union1d(staged_frame[JOIN_FIELD].to_numpy(dtype=np.int64), np.asarray(drop_ids, dtype=np.int64))
+    kept = existing_frame[~existing_frame[JOIN_FIELD].isin(replaced)]
+    merged = pd.concat([kept, staged_frame]) if len(kept) else staged_frame
+    merged = merged.sort_values(JOIN_FIELD, kind='stable')
+    new_table = _to_table(merged, schema)
+
+    old_sorted = existing.sort_by(JOIN_FIELD) if existing.num_rows else existing
+    if new_table.num_rows == old_sorted.num_rows and new_table.equals(old_sorted):
+        return False
+    if new_table.num_rows == 0:
+        if os.path.exists(path):
+            os.remove(path)
+            return True
+        return False
+    _write_atomic(new_table, path)
+    return True
+
+
+def ingest(path, out="data", chunk_rows=CHUNK_ROWS, delete_missing=False):
+    """Upsert a source extract into the partitioned datasets under `out`.
+
+    With delete_missing, wells absent from the source are removed. Returns
+    {dataset: [rewritten partition keys]}.
+    """
+    old_index = _read_index(out)
+    assignments = stage_source(path, out, chunk_rows)
+
+    # Wells that moved partition (or vanished) must be removed from their old partition
+    merged = old_index.merge(assignments, on=JOIN_FIELD, how='left', suffixes=('_old', ''))
+    moved = merged['partition'].notna() & (merged['partition'] != merged['partition_old'])
+    if delete_missing:
+        moved |= merged['partition'].isna()
+    removals = merged[moved].groupby('partition_old')[JOIN_FIELD].apply(list).to_dict()
+
+    affected = set(assignments['partition']) | set(removals)
+    rewritten = {}
+    for dataset in DATASETS:
+        rewritten[dataset] = sorted(
+            key for key in affected if _merge_partition(out, dataset, key, removals.get(key, []))
+        )
+
+    if delete_missing:
+        new_index = assignments
+    else:
+        new_index = pd.concat([old_index[~old_index[JOIN_FIELD].isin(assignments[JOIN_FIELD])], assignments])
+    _write_atomic(pa.Table.from_pandas(new_index.sort_values(JOIN_FIELD), preserve_index=False),
+                  os.path.join(out, "_index.parquet"))
+    shutil.rmtree(os.path.join(out, "_staging"), ignore_errors=True)
+    return rewritten
+
+
+def write_flat(out, dataset, path):
+    """Concatenate a partitioned dataset into a single Parquet file, one partition at a time."""
+    root = os.path.join(out, dataset)
+    schema = DATASETS[dataset]
+    tmp_path = f"{path}.tmp"
+    with pq.ParquetWriter(tmp_path, schema, compression=COMPRESSION, write_statistics=True) as writer:
+        for partition in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+            part_path = os.path.join(root, partition, "part-0.parquet")
+            if os.path.exists(part_path):
+                writer.write_table(_read_file(part_path).cast(schema), row_group_size=ROW_GROUP_ROWS)
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a GWSI wells extract into partitioned Parquet.")
+    parser.add_argument("source", help="GWSI extract (.csv or .parquet)")
+    parser.add_argument("--out", default="data", help="Output directory for the partitioned datasets.")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--delete-missing", action="store_true",
+                        help="Remove wells that are not in the source extract.")
+    parser.add_argument("--flat", action="store_true",
+                        help="Also rewrite wells_cleaned_main.parquet and wells_metadata.parquet.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rewritten = ingest(args.source, args.out, args.chunk_rows, args.delete_missing)
+    for dataset, keys in rewritten.items():
+        print(f"{dataset}: rewrote {len(keys)} partition(s) {keys}")
+    if args.flat:
+        for dataset, path in FLAT_OUTPUTS.items():
+            write_flat(args.out, dataset, path)
+            print(f"✅ Saved: `{path}`")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,329 @@
+"""
+Gridded interpolation of well values into water-level surfaces.
+
+Values such as wl_dtw or wl_elev are interpolated onto a regular lon/lat grid
+with inverse distance weighting (IDW) over the nearest wells found with a
+KD-tree, or with local ordinary kriging on the same neighborhoods. The grid is
+clipped to the selected subbasin, AMA/INA or aquifer polygon (the state
+boundary when no group is selected). Large grids are split into chunks that
+run across a process pool.
+
+Rasters are cached as compressed .npz files keyed on (group, variable,
+resolution, method) and the wells dataset version.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+import shapely
+from scipy.optimize import curve_fit
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import pdist
+
+from datasets import dataset_version, get_wells
+from group_index import normalize_group
+from profiling import timed
+
+CACHE_DIR = os.path.join(".cache", "rasters")
+CACHE_VERSION = 1
+
+STATE_BOUNDARY_PATH = "shapefiles/AZ_State_Bound.shp"
+
+METHODS = ("idw", "kriging")
+
+# Grid cell size in degrees (0.01 is about 1 km)
+DEFAULT_RESOLUTION = 0.01
+
+IDW_NEIGHBORS = 12
+IDW_POWER = 2.0
+
+# Cells per chunk; kriging solves a (neighbors + 1)^2 system per cell, so its chunks are smaller
+IDW_CHUNK_CELLS = 250_000
+KRIGING_CHUNK_CELLS = 20_000
+
+# Grids with fewer cells than this are interpolated in-process
+PARALLEL_MIN_CELLS = 200_000
+
+# Wells used to fit the kriging variogram
+VARIOGRAM_SAMPLE = 2000
+VARIOGRAM_LAGS = 20
+
+_boundary = None
+_memory_cache = {}
+_lock = threading.Lock()
+
+# Cache key -> lock held while that surface is built, so concurrent callers build it once
+_build_locks = {}
+
+# Set in each pool worker by _init_worker
+_worker_state = None
+
+
+def _local_coordinates(lon, lat, lat0):
+    """Scale longitude by cos(lat0) so Euclidean distances are roughly isotropic."""
+    return np.column_stack([np.asarray(lon) * np.cos(np.radians(lat0)), np.asarray(lat)])
+
+
+def exponential_variogram(h, nugget, sill, range_):
+    return nugget + sill * (1.0 - np.exp(-h / range_))
+
+
+def fit_variogram(points, values, seed=0):
+    """Fit an exponential variogram to a sample of the points; returns (nugget, sill, range)."""
+    rng = np.random.default_rng(seed)
+    if len(points) > VARIOGRAM_SAMPLE:
+        keep = rng.choice(len(points), VARIOGRAM_SAMPLE, replace=False)
+        points, values = points[keep], values[keep]
+    distances = pdist(points)
+    semivariance = 0.5 * pdist(values[:, None], 'sqeuclidean')
+    max_lag = distances.max() / 2 if len(distances) else 1.0
+    edges = np.linspace(0, max_lag, VARIOGRAM_LAGS + 1)
+    bins = np.digitize(distances, edges) - 1
+    valid = (bins >= 0) & (bins < VARIOGRAM_LAGS)
+    counts = np.bincount(bins[valid], minlength=VARIOGRAM_LAGS)
+    sums = np.bincount(bins[valid], weights=semivariance[valid], minlength=VARIOGRAM_LAGS)
+    filled = counts > 0
+    lags = ((edges[:-1] + edges[1:]) / 2)[filled]
+    gamma = sums[filled] / counts[filled]
+
+    variance = float(np.var(values)) or 1.0
+    initial = (0.1 * variance, variance, max_lag / 3 or 1.0)
+    try:
+        params, _ = curve_fit(exponential_variogram, lags, gamma, p0=initial,
+                              bounds=([0, 0, 1e-9], [np.inf, np.inf, np.inf]), maxfev=5000)
+    except (RuntimeError, ValueError, TypeError):
+        params = initial
+    return tuple(float(p) for p in params)
+
+
+def idw(tree, values, cells, neighbors=IDW_NEIGHBORS, power=IDW_POWER):
+    """Inverse-distance-weighted estimates at cells from the k nearest points."""
+    k = min(neighbors, len(values))
+    distances, index = tree.query(cells, k=k)
+    if k == 1:
+        return values[index]
+    distances = distances.reshape(len(cells), k)
+    index = index.reshape(len(cells), k)
+    with np.errstate(divide='ignore'):
+        weights = 1.0 / distances ** power
+    # Cells on top of a well take its value
+    exact = np.isinf(weights)
+    weights = np.where(exact.any(axis=1)[:, None], exact.astype(float), weights)
+    return (weights * values[index]).sum(axis=1) / weights.sum(axis=1)
+
+
+def ordinary_kriging(tree, points, values, cells, variogram, neighbors=IDW_NEIGHBORS):
+    """Local ordinary kriging estimates at cells using the k nearest points.
+
+    Every cell solves its own (k + 1) x (k + 1) kriging system; the systems
+    of a chunk are solved together as one batched linear solve.
+    """
+    k = min(neighbors, len(values))
+    if k < 2:
+        return idw(tree, values, cells, neighbors)
+    distances, index = tree.query(cells, k=k)
+    near = points[index]
+    pairwise = np.linalg.norm(near[:, :, None, :] - near[:, None, :, :], axis=-1)
+
+    n = len(cells)
+    system = np.ones((n, k + 1, k + 1))
+    system[:, :k, :k] = exponential_variogram(pairwise, *variogram)
+    system[:, np.arange(k), np.arange(k)] = 0.0
+    system[:, k, k] = 0.0
+    rhs = np.ones((n, k + 1))
+    rhs[:, :k] = exponential_variogram(distances, *variogram)
+    try:
+        weights = np.linalg.solve(system, rhs[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return idw(tree, values, cells, neighbors)
+    estimate = (weights[:, :k] * values[index]).sum(axis=1)
+    # Cells on top of a well take its value
+    exact = distances[:, 0] == 0
+    estimate[exact] = values[index[exact, 0]]
+    return estimate
+
+
+def _init_worker(points, values, method, variogram, neighbors, power):
+    global _worker_state
+    _worker_state = (cKDTree(points), points, values, method, variogram, neighbors, power)
+
+
+def _interpolate_chunk(cells):
+    tree, points, values, method, variogram, neighbors, power = _worker_state
+    if method == "kriging":
+        return ordinary_kriging(tree, points, values, cells, variogram, neighbors)
+    return idw(tree, values, cells, neighbors, power)
+
+
+def interpolate(points, values, cells, method="idw", neighbors=IDW_NEIGHBORS, power=IDW_POWER, workers=None):
+    """Interpolate point values at cell coordinates (both in local coordinates).
+
+    Grids of at least PARALLEL_MIN_CELLS cells are processed in chunks across
+    a process pool of `workers` processes (default: one per CPU).
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    variogram = fit_variogram(points, values) if method == "kriging" else None
+    chunk_cells = KRIGING_CHUNK_CELLS if method == "kriging" else IDW_CHUNK_CELLS
+    chunks = [cells[start:start + chunk_cells] for start in range(0, len(cells), chunk_cells)]
+    workers = workers or os.cpu_count() or 1
+    init_args = (points, values, method, variogram, neighbors, power)
+
+    if len(cells) < PARALLEL_MIN_CELLS or workers < 2 or len(chunks) < 2:
+        _init_worker(*init_args)
+        results = [_interpolate_chunk(chunk) for chunk in chunks]
+    else:
+        # forkserver keeps worker start-up cheap without forking the server's threads
+        context = multiprocessing.get_context("forkserver")
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context,
+                                 initializer=_init_worker, initargs=init_args) as pool:
+            results = list(pool.map(_interpolate_chunk, chunks))
+    return np.concatenate(results) if results else np.empty(0)
+
+
+def _state_boundary():
+    global _boundary
+    with _lock:
+        if _boundary is None:
+            import geopandas as gpd
+            gdf = gpd.read_file(STATE_BOUNDARY_PATH).to_crs("EPSG:4326")
+            _boundary = shapely.union_all(gdf.geometry.to_numpy())
+        return _boundary
+
+
+def group_polygon(group_col=None, selected_group=None):
+    """Polygon to clip a surface to: the selected region's shapes, or the state boundary.
+
+    Groups of non-spatial columns (geology, lithology) use the convex hull of
+    their wells within the state.
+    """
+    from spatial_join import JOIN_LAYERS, get_layer
+
+    boundary = _state_boundary()
+    if not (group_col and selected_group):
+        return boundary
+    for name, spec in JOIN_LAYERS.items():
+        if group_col in spec["columns"].values():
+            layer = get_layer(name)
+            names = layer.attributes[group_col].astype(str).str.strip().str.lower()
+            matches = layer.geometries[(names == normalize_group(selected_group)).to_numpy()]
+            return shapely.union_all(matches) if len(matches) else None
+
+    from well_functions import select_group
+    wells = select_group(get_wells(['x', 'y', group_col]), group_col, selected_group).dropna(subset=['x', 'y'])
+    if wells.empty:
+        return None
+    hull = shapely.MultiPoint(wells[['x', 'y']].to_numpy()).convex_hull
+    return shapely.intersection(hull, boundary)
+
+
+def _cache_key(variable, group_col, selected_group, resolution, method):
+    group = f"{group_col}={normalize_group(selected_group)}" if group_col and selected_group else "all"
+    return f"{group}|{variable}|{resolution:g}|{method}"
+
+
+def _cache_path(key):
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode()).hexdigest()[:20] + ".npz")
+
+
+def _fingerprint(key):
+    return f"v{CACHE_VERSION};{key};{dataset_version()}"
+
+
+def _read_cached(path, fingerprint):
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["fingerprint"]) != fingerprint:
+                return None
+            return {key: data[key] for key in ("values", "lon", "lat", "wells")}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_cached(path, raster, fingerprint):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A unique temp file per writer, so concurrent threads and processes never share one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.savez_compressed(f, fingerprint=np.array(fingerprint), **raster)
+    os.replace(tmp_path, path)
+
+
+def build_surface(variable, group_col=None, selected_group=None, resolution=DEFAULT_RESOLUTION,
+                  method="idw", workers=None):
+    """Interpolate `variable` onto a grid clipped to the group's polygon.
+
+    Returns a dict with 'values' (float32, lat x lon, NaN outside the
+    polygon), cell-center 'lon' and 'lat' arrays and the number of 'wells'
+    used. Wells in a margin of neighboring cells around the polygon are
+    included so the surface does not bend towards the edges.
+    """
+    polygon = group_polygon(group_col, selected_group)
+    empty = {"values": np.empty((0, 0), np.float32), "lon": np.empty(0), "lat": np.empty(0), "wells": np.array(0)}
+    if polygon is None or polygon.is_empty:
+        return empty
+
+    min_x, min_y, max_x, max_y = polygon.bounds
+    lon = np.arange(min_x + resolution / 2, max_x, resolution)
+    lat = np.arange(min_y + resolution / 2, max_y, resolution)
+    grid_x, grid_y = np.meshgrid(lon, lat)
+    inside = shapely.contains_xy(polygon, grid_x, grid_y)
+
+    wells = get_wells(['x', 'y', variable]).dropna()
+    margin = max(resolution * IDW_NEIGHBORS, 0.1)
+    near = wells[(wells['x'] >= min_x - margin) & (wells['x'] <= max_x + margin)
+                 & (wells['y'] >= min_y - margin) & (wells['y'] <= max_y + margin)]
+    # Wells sharing a location are averaged so kriging systems stay non-singular
+    near = near.groupby(['x', 'y'], as_index=False)[variable].mean()
+    if near.empty or not inside.any():
+        return empty
+
+    lat0 = (min_y + max_y) / 2
+    points = _local_coordinates(near['x'], near['y'], lat0)
+    cells = _local_coordinates(grid_x[inside], grid_y[inside], lat0)
+    values = np.full(grid_x.shape, np.nan, dtype=np.float32)
+    values[inside] = interpolate(points, near[variable].to_numpy(dtype=float), cells, method=method, workers=workers)
+    return {"values": values, "lon": lon, "lat": lat, "wells": np.array(len(near))}
+
+
+@timed
+def get_surface(variable, group_col=None, selected_group=None, resolution=DEFAULT_RESOLUTION, method="idw"):
+    """Return a cached surface (see build_surface), building it on a miss."""
+    key = _cache_key(variable, group_col, selected_group, resolution, method)
+    fingerprint = _fingerprint(key)
+    with _lock:
+        cached = _memory_cache.get(key)
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    with build_lock:
+        # Another thread may have built it while this one waited
+        with _lock:
+            cached = _memory_cache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        path = _cache_path(key)
+        raster = _read_cached(path, fingerprint)
+        if raster is None:
+            raster = build_surface(variable, group_col, selected_group, resolution, method)
+            _write_cached(path, raster, fingerprint)
+        with _lock:
+            _memory_cache[key] = (fingerprint, raster)
+    return raster
+
+
+def clear_surface_cache(remove_files=False):
+    """Drop the in-process raster cache and optionally the on-disk rasters."""
+    with _lock:
+        _memory_cache.clear()
+    if remove_files and os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(CACHE_DIR, name))
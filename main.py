@@ -20,16 +20,34 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+from warmup import render_warmup_status, start_warmup
+
+# Warm the shared caches in a background thread (started once per server process)
+start_warmup()
+
 from well_functions import *
 from mapping import plot_wells_on_map
 from mapping import render_map_ui
+from export import render_export_ui
+from datasets import get_wells
+from decimation import DEFAULT_POINT_BUDGET, hidden_points
+from figure_cache import cache_info
+from waterlevels import has_water_levels
+from query import render_filter_ui
+from profiling import PROFILE_DEFAULT, finish_run, render_profile_panel, start_run
+from figure_scheduler import FigureScheduler
 import pandas as pd
 
 
 
-# Load data
-df = pd.read_parquet("wells_cleaned_main.parquet")
-df = ensure_coordinates(df)
+# Optional per-rerun profiling (instrumented calls are no-ops while this is off)
+show_profile = st.sidebar.checkbox("Show profiling panel", value=PROFILE_DEFAULT)
+start_run(show_profile)
+render_warmup_status()
+
+# Load data (shared across sessions; water_use is pre-joined from the metadata)
+df = get_wells()
+get_group_index()
 
 
 
@@ -70,18 +88,24 @@ group_col_label = st.selectbox("Select a field to group by:", list(label_to_grou
 value_col = label_to_col[value_col_label]
 group_col = label_to_group_col[group_col_label]
 
+# Attribute filters are pushed down into the Parquet scan; without any the shared frame is used
+filters = render_filter_ui(df, group_by_columns) or None
+wells_df = get_wells_data(filters)
+
 # Optional group selection
-summary_stats = get_summary_stats(value_col, group_col)
+summary_stats = get_summary_stats(value_col, group_col, filters=filters)
 group_options = summary_stats[group_col].dropna().unique()
 selected_group = st.selectbox(f"Filter by group in {group_col} (optional):", ["All"] + list(group_options))
 if selected_group == "All":
     selected_group = None
 
-# Filter the dataframe
-if selected_group and group_col:
-    filtered_df = df[df[group_col].str.strip().str.lower() == selected_group.lower()]
-else:
-    filtered_df = df.copy()
+
+
+# Level-of-detail settings for the point-heavy plots
+st.sidebar.markdown("### Level of Detail")
+use_lod = st.sidebar.checkbox("Limit points sent to the browser", value=True)
+point_budget = st.sidebar.number_input("Point budget", min_value=1000, max_value=500000,
+                                       value=DEFAULT_POINT_BUDGET, step=1000) if use_lod else None
 
 
 # Store selections in session_state so they’re accessible in mapping.py
@@ -93,58 +117,87 @@ st.session_state["selected_group"] = selected_group
 st.subheader("Summary Statistics")
 st.dataframe(summary_stats)
 
+# Independent figures are built concurrently and drawn into their places as they finish
+scheduler = FigureScheduler()
+
+
+def render_scatter(fig):
+    st.plotly_chart(fig, use_container_width=True, key="scatter_xyz")
+    if hidden_points(fig):
+        st.caption(f"Level of detail: {hidden_points(fig):,} wells hidden.")
+
+
 # Show plots
 st.subheader("Boxplot")
 #st.plotly_chart(make_boxplot(value_col, group_col, selected_group), use_container_width=True)
-st.plotly_chart(make_boxplot(value_col, group_col, selected_group), use_container_width=True, key="boxplot")
+scheduler.submit("Boxplot", lambda: make_boxplot(value_col, group_col, selected_group, filters=filters),
+                 lambda fig: st.plotly_chart(fig, use_container_width=True, key="boxplot"))
 
 st.subheader("Histogram")
 #st.plotly_chart(make_histogram(value_col, selected_group, group_col), use_container_width=True)
-st.plotly_chart(make_histogram(value_col, selected_group, group_col), use_container_width=True, key="histogram")
+scheduler.submit("Histogram", lambda: make_histogram(value_col, selected_group, group_col, filters=filters),
+                 lambda fig: st.plotly_chart(fig, use_container_width=True, key="histogram"))
 
 
 st.subheader("3D Scatter Plot")
 #st.plotly_chart(make_scatter_xyz(value_col, selected_group, group_col), use_container_width=True)
-st.plotly_chart(make_scatter_xyz(value_col, selected_group, group_col), use_container_width=True, key="scatter_xyz")
-
-# Load metadata
-metadata = pd.read_parquet("wells_metadata.parquet")
-
+scheduler.submit("3D scatter plot",
+                 lambda: make_scatter_xyz(value_col, selected_group, group_col, point_budget=point_budget, filters=filters),
+                 render_scatter)
 
-
-# Show these sections only if a group has been selected
+# Show these sections only if a group has been selected; the charts below the fold are built once switched on
 if selected_group:
-    file_safe_group = selected_group.replace(" ", "_").lower()
-else:
-    file_safe_group = "all"
+    # 3D well depth profile
+    st.subheader("3D View of Well Depths")
+    if st.toggle("Show the 3D view of well depths", key="show_vertical_profile"):
+        depth_mode = st.radio("Choose vertical extent mode:", options=["wl_dtw", "well_depth"])
+        scheduler.submit("3D view of well depths",
+                         lambda: make_well_vertical_plot(wells_df, selected_group=selected_group,
+                                                         group_col=group_col, depth_mode=depth_mode),
+                         lambda fig: st.plotly_chart(fig, use_container_width=True, key="well_vertical_profile"))
+
+# Map of wells; with "All" selected it defaults to hexagons aggregating the whole state
+if st.toggle("Show the map of selected wells", key="show_map"):
+    render_map_ui(wells_df, selected_group, group_col, point_budget=point_budget, scheduler=scheduler)
 
-file_name = f"filtered_wells_{file_safe_group}.csv"
+scheduler.render()
 
 if selected_group:
-    # 3D well depth profile
-    st.subheader("3D View of Well Depths")
-    depth_mode = st.radio("Choose vertical extent mode:", options=["wl_dtw", "well_depth"])
-    fig = make_well_vertical_plot(
-        df,
-        metadata=metadata,
-        selected_group=selected_group,
-        group_col=group_col,
-        depth_mode=depth_mode
-    )
-    st.plotly_chart(fig, use_container_width=True, key="well_vertical_profile")
-
-    # Map of wells
-    render_map_ui(df, selected_group, group_col)
-
-    # ✅ Download section
-
-    st.markdown("### Download Filtered Data")
-    csv = filtered_df.to_csv(index=False).encode('utf-8')
-    file_safe_group = selected_group.replace(" ", "_").lower()
-    file_name = f"filtered_wells_{file_safe_group}.csv"
-    st.download_button(
-        label="⬇️ Download CSV",
-        data=csv,
-        file_name=file_name,
-        mime='text/csv'
-    )
\ No newline at end of file
+    # Interpolated water-level surface over the selected region (built on request, then cached)
+    st.subheader("Interpolated Surface")
+    surface_cols = st.columns(3)
+    with surface_cols[0]:
+        surface_col = st.selectbox("Surface variable:", ["wl_dtw", "wl_elev"], format_func=get_label)
+    with surface_cols[1]:
+        surface_method = st.radio("Method:", ["idw", "kriging"], format_func=str.upper, horizontal=True)
+    with surface_cols[2]:
+        surface_resolution = st.select_slider("Cell size (degrees):", options=[0.005, 0.01, 0.02, 0.05], value=0.01)
+    if st.checkbox("Show interpolated surface"):
+        with st.spinner("Interpolating..."):
+            surface_fig = make_surface_plot(surface_col, group_col, selected_group, surface_resolution, surface_method)
+        st.plotly_chart(surface_fig, use_container_width=True, key="surface")
+
+    # Water-level history (only once the time-series store has been built)
+    if has_water_levels() and st.toggle("Show water-level history", key="show_water_levels"):
+        st.subheader("Water-Level History")
+        st.plotly_chart(make_dtw_trend(group_col, selected_group), use_container_width=True, key="dtw_trend")
+        min_decline = st.number_input("Show wells with a decline greater than (ft/decade):",
+                                      min_value=0.0, value=5.0, step=0.5)
+        declining = get_declining_wells(min_decline, group_col, selected_group)
+        st.markdown(f"**{len(declining):,} wells declining faster than {min_decline:g} ft/decade**")
+        st.dataframe(declining, hide_index=True)
+        if len(declining):
+            hydrograph_well = st.selectbox("Hydrograph for well (OBJECTID):", declining['objectid'])
+            st.plotly_chart(make_hydrograph(hydrograph_well), use_container_width=True, key="hydrograph")
+
+    # ✅ Download section (the file is only built when requested)
+    render_export_ui(selected_group, group_col, filters)
+
+
+# Shared figure cache counters (updated after this run's plots were built)
+figure_stats = cache_info()
+st.sidebar.caption(f"Figure cache: {figure_stats['hits']:,} hits / {figure_stats['misses']:,} misses, "
+                   f"{figure_stats['entries']} figures ({figure_stats['bytes'] / 1e6:.1f} MB)")
+
+if show_profile:
+    render_profile_panel(finish_run())
@@ -1,28 +1,108 @@
-import geopandas as gpd
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-import json
-import streamlit as st
-from well_functions import ensure_coordinates
-
-# Load Arizona boundary for default extent
-az_boundary = gpd.read_file("shapefiles/AZ_State_Bound.shp").to_crs(epsg=4326)
-
-def plot_wells_on_map(df, selected_group=None, group_col=None, show_subbasin=False, show_amas=False, show_aquifers=False):
-    """Create a map of wells with optional overlays for subbasins, AMAs/INAs, and aquifers."""
-
-    df = ensure_coordinates(df)
-    if selected_group and group_col:
-        df[group_col] = df[group_col].str.strip().str.lower()
-        selected_group = selected_group.lower()
-        df = df[df[group_col] == selected_group]
-
-    gdf_points = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df['x'], df['y']), crs='EPSG:4326')
+"""
+Map of wells with state boundary and shapefile overlays.
+
+geopandas, plotly and Streamlit are imported on first use, and the state
+boundary shapefile is read by the first map that needs it (get_az_boundary).
+"""
+import threading
+
+from well_functions import ensure_coordinates, get_available_columns, get_label, select_group, shared_frame_token
+from figure_cache import cached_figure
+from profiling import timed
+
+AZ_BOUNDARY_PATH = "shapefiles/AZ_State_Bound.shp"
+
+# Opacity of overlay fills drawn as mapbox layers
+OVERLAY_FILL_OPACITY = 0.35
+
+# Initial map view (statewide) and the deepest zoom offered by the map's zoom control
+DEFAULT_MAP_ZOOM = 5
+MAX_MAP_ZOOM = 12
+AZ_CENTER = {"lat": 34.0, "lon": -111.5}
+
+_az_boundary = None
+_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # az_boundary used to be read at import; it is now loaded on first access
+    if name == 'az_boundary':
+        return get_az_boundary()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@timed
+def get_az_boundary():
+    """Arizona boundary for the default extent (read once per process)."""
+    global _az_boundary
+    with _lock:
+        if _az_boundary is None:
+            import geopandas as gpd
+            from overlays import source_fingerprint
+            from shared_store import shared_geometries
+            shared = shared_geometries(AZ_BOUNDARY_PATH, source_fingerprint(AZ_BOUNDARY_PATH))
+            if shared is not None:
+                geometries, attributes = shared
+                _az_boundary = gpd.GeoDataFrame(attributes, geometry=geometries, crs="EPSG:4326")
+            else:
+                _az_boundary = gpd.read_file(AZ_BOUNDARY_PATH).to_crs(epsg=4326)
+        return _az_boundary
+
+
+@timed
+def overlay_map_layers(geojson, colors=None, other_color="#999999"):
+    """Mapbox fill layers for a GeoJSON overlay, colored per region like the trace renderer.
+
+    Features are grouped by their color, so a layer needs at most
+    len(colors) + 1 mapbox layers however many regions it has. colors
+    defaults to plotly's Set3 palette.
+    """
+    if colors is None:
+        import plotly.express as px
+        colors = px.colors.qualitative.Set3
+    by_color = {}
+    for i, feature in enumerate(geojson["features"]):
+        by_color.setdefault(colors[i] if i < len(colors) else other_color, []).append(feature)
+    return [
+        dict(sourcetype="geojson",
+             source={"type": "FeatureCollection", "features": features},
+             type="fill",
+             color=color,
+             opacity=OVERLAY_FILL_OPACITY,
+             fill=dict(outlinecolor=color),
+             below="traces")
+        for color, features in by_color.items()
+    ]
+
+
+@timed
+@cached_figure("well_map", frame_token=shared_frame_token)
+def plot_wells_on_map(df, selected_group=None, group_col=None, show_subbasin=False, show_amas=False, show_aquifers=False, zoom=DEFAULT_MAP_ZOOM, point_budget=None, overlay_mode="layers", hex_value=None, hex_stat="median", hex_level=None):
+    """Create a map of wells with optional overlays for subbasins, AMAs/INAs, and aquifers.
+
+    With point_budget set and more wells than the budget, wells are drawn as
+    density cells below DETAIL_ZOOM and decimated to the budget above it.
+    overlay_mode="layers" draws overlays as GeoJSON mapbox layers (holes kept,
+    no extra traces); "traces" draws one filled trace per region with a legend entry.
+    zoom is the initial zoom of the map; zoomed in past DEFAULT_MAP_ZOOM the map
+    is centered on the shown wells. Plotly does not report the browser's zoom
+    back to the server, so the detail switch follows this argument (the
+    zoom control of render_map_ui), not scroll zooming.
+    hex_value="count" or a value column draws the wells instead as hexagons
+    colored by their well count or by hex_stat of that column (see hexbin);
+    hex_level picks a level of hexbin.HEX_SIZES, by default the one fitting zoom.
+    """
+    import numpy as np
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from decimation import DETAIL_ZOOM, cell_size_for_zoom, decimate_points, density_cells
+    from overlays import iter_regions, load_overlay, load_overlay_geojson
+
+    df = select_group(ensure_coordinates(df), group_col, selected_group)
     fig = go.Figure()
 
     # Plot Arizona boundary
-    for _, geom in az_boundary.iterrows():
+    for _, geom in get_az_boundary().iterrows():
         if geom.geometry and geom.geometry.geom_type == 'Polygon':
             x, y = geom.geometry.exterior.xy
             fig.add_trace(go.Scattermapbox(
@@ -32,130 +112,119 @@ def plot_wells_on_map(df, selected_group=None, group_col=None, show_subbasin=Fal
             ))
 
     # Optional shapefile overlays
-    if show_subbasin:
-        gdf = gpd.read_file("shapefiles/ADWR Groundwater Subbasin.shp").to_crs("EPSG:4326")
-        gdf.columns = gdf.columns.str.strip().str.lower()
-        print(gdf.columns.tolist())
-        display_col = 'subbasin_n'
-
-        unique_names = gdf[display_col].dropna().unique()
-        name_map = {name.strip().lower(): name for name in unique_names}
-        color_map = dict(zip(name_map.keys(), px.colors.qualitative.Set3[:len(name_map)]))
-
-        for name_norm, name in name_map.items():
-            sub_df = gdf[gdf[display_col].str.strip().str.lower() == name_norm]
-            for _, row in sub_df.iterrows():
-                geom = row["geometry"]
-                if geom:
-                    if geom.geom_type == 'Polygon':
-                        polys = [geom]
-                    elif geom.geom_type == 'MultiPolygon':
-                        polys = list(geom.geoms)
-                    else:
-                        continue
-
-                    for poly in polys:
-                        x, y = poly.exterior.xy
-                        fig.add_trace(go.Scattermapbox(
-                            lat=list(y), lon=list(x),
-                            mode="lines",
-                            fill="toself",
-                            line=dict(width=1, color=color_map.get(name_norm, "#999999")),
-                            name=name,
-                            showlegend=True
-                        ))
-
-    if show_amas:
-        gdf = gpd.read_file("shapefiles/AMAs_and_INAs.shp").to_crs("EPSG:4326")
-        gdf.columns = gdf.columns.str.strip().str.lower()
-        print(gdf.columns.tolist())
-        display_col = 'basin_name'
-
-        unique_names = gdf[display_col].dropna().unique()
-        name_map = {name.strip().lower(): name for name in unique_names}
-        color_map = dict(zip(name_map.keys(), px.colors.qualitative.Set3[:len(name_map)]))
-
-        for name_norm, name in name_map.items():
-            sub_df = gdf[gdf[display_col].str.strip().str.lower() == name_norm]
-            for _, row in sub_df.iterrows():
-                geom = row["geometry"]
-                if geom:
-                    if geom.geom_type == 'Polygon':
-                        polys = [geom]
-                    elif geom.geom_type == 'MultiPolygon':
-                        polys = list(geom.geoms)
-                    else:
-                        continue
-
-                    for poly in polys:
-                        x, y = poly.exterior.xy
-                        fig.add_trace(go.Scattermapbox(
-                            lat=list(y), lon=list(x),
-                            mode="lines",
-                            fill="toself",
-                            line=dict(width=1, color=color_map.get(name_norm, "#999999")),
-                            name=name,
-                            showlegend=True
-                        ))
-
-    if show_aquifers:
-        gdf = gpd.read_file("shapefiles/Major_Aquifers.shp").to_crs("EPSG:4326")
-        gdf.columns = gdf.columns.str.strip().str.lower()
-        print(gdf.columns.tolist())
-        display_col = 'aq_name'
-
-        unique_names = gdf[display_col].dropna().unique()
-        name_map = {name.strip().lower(): name for name in unique_names}
-        color_map = dict(zip(name_map.keys(), px.colors.qualitative.Set3[:len(name_map)]))
-
-        for name_norm, name in name_map.items():
-            sub_df = gdf[gdf[display_col].str.strip().str.lower() == name_norm]
-
-            legend_added = False  # ✅ only once per name_norm
-
-            for _, row in sub_df.iterrows():
-                geom = row["geometry"]
-                if geom:
-                    if geom.geom_type == 'Polygon':
-                        polys = [geom]
-                    elif geom.geom_type == 'MultiPolygon':
-                        polys = list(geom.geoms)
-                    else:
-                        continue
-
-                    for poly in polys:
-                        x, y = poly.exterior.xy
-                        fig.add_trace(go.Scattermapbox(
-                            lat=list(y), lon=list(x),
-                            mode="lines",
-                            fill="toself",
-                            line=dict(width=1, color=color_map.get(name_norm, "#999999")),
-                            name=name,
-                            showlegend=not legend_added
-                        ))
-                        legend_added = True  # ✅ toggled after first plot
+    overlay_flags = {"subbasin": show_subbasin, "amas": show_amas, "aquifers": show_aquifers}
+    mapbox_layers = []
+    for layer, show in overlay_flags.items():
+        if not show:
+            continue
+        if overlay_mode == "layers":
+            mapbox_layers += overlay_map_layers(load_overlay_geojson(layer, zoom))
+            continue
+        # One trace per named region
+        overlay = load_overlay(layer, zoom)
+        regions = list(iter_regions(overlay))
+        colors = px.colors.qualitative.Set3
+        for i, (name, lon, lat) in enumerate(regions):
+            fig.add_trace(go.Scattermapbox(
+                lat=lat, lon=lon,
+                mode="lines",
+                fill="toself",
+                line=dict(width=1, color=colors[i] if i < len(colors) else "#999999"),
+                name=name,
+                showlegend=True
+            ))
+
+    # Zoomed-in maps open on the shown wells instead of the middle of the state
+    center = AZ_CENTER
+    if zoom > DEFAULT_MAP_ZOOM and df[['x', 'y']].notna().all(axis=1).any():
+        center = {"lat": float(df['y'].median()), "lon": float(df['x'].median())}
 
     # Add well points
-    fig.add_trace(go.Scattermapbox(
-        lat=gdf_points.geometry.y,
-        lon=gdf_points.geometry.x,
-        mode='markers',
-        marker=dict(size=5, color='red'),
-        name='Wells'))
+    hidden = 0
+    if hex_value is not None:
+        fig.add_trace(hexagon_trace(df, zoom, hex_value, hex_stat, hex_level))
+    elif point_budget is not None and zoom < DETAIL_ZOOM and len(df) > point_budget:
+        cells = density_cells(df['x'], df['y'], cell_size_for_zoom(zoom))
+        fig.add_trace(go.Scattermapbox(
+            lat=cells['y'],
+            lon=cells['x'],
+            mode='markers',
+            marker=dict(size=np.clip(4 + 2 * np.sqrt(cells['count']), 4, 30), color='red', opacity=0.6),
+            hovertext=cells['count'].astype(str) + " wells",
+            hoverinfo='text',
+            name='Wells (density)'))
+    else:
+        df, hidden = decimate_points(df, point_budget)
+        fig.add_trace(go.Scattermapbox(
+            lat=df['y'],
+            lon=df['x'],
+            mode='markers',
+            marker=dict(size=5, color='red'),
+            customdata=df['objectid'] if 'objectid' in df.columns else None,
+            name='Wells'))
 
     fig.update_layout(
         mapbox_style="carto-positron",
-        mapbox_zoom=5,
-        mapbox_center={"lat": 34.0, "lon": -111.5},
+        mapbox_zoom=zoom,
+        mapbox_center=center,
         margin={"r": 0, "t": 0, "l": 0, "b": 0},
-        height=600
+        height=600,
+        mapbox_layers=mapbox_layers,
+        meta=dict(hidden_points=hidden)
     )
 
     return fig
 
 
-def render_map_ui(df, selected_group, group_col):
-    """Streamlit UI wrapper for map generation with layer toggles."""
+@timed
+def hex_cells(df, level):
+    """Hexagon statistics of df at a pyramid level; the shared dataset's come from the cached pyramid."""
+    from datasets import dataset_version
+    from hexbin import HEX_SIZES, HEX_VALUE_COLUMNS, aggregate_hexes, get_hex_pyramid
+    from well_functions import get_group_index
+    value_cols = [c for c in HEX_VALUE_COLUMNS if c in df.columns]
+    if get_group_index().covers(df):
+        return get_hex_pyramid(df, value_cols, dataset_version())[level]
+    return aggregate_hexes(df['x'], df['y'], {c: df[c] for c in value_cols}, HEX_SIZES[level])
+
+
+@timed
+def hexagon_trace(df, zoom, hex_value, hex_stat="median", hex_level=None):
+    """Choropleth trace of the wells of df binned into hexagons, colored by count or by hex_stat of hex_value."""
+    import plotly.graph_objects as go
+    from hexbin import HEX_SIZES, hex_geojson, hex_ids, hex_level_for_zoom
+    level = hex_level_for_zoom(zoom) if hex_level is None else hex_level
+    cells = hex_cells(df, level)
+    if hex_value == "count":
+        column, title = "count", "Wells"
+        hovertext = cells['count'].astype(str) + " wells"
+    else:
+        column, title = f"{hex_value}_{hex_stat}", f"{hex_value} ({hex_stat})"
+        cells = cells[cells[column].notna()]
+        hovertext = (cells['count'].astype(str) + f" wells<br>{hex_stat} {get_label(hex_value)}: "
+                     + cells[column].map('{:,.1f}'.format))
+    return go.Choroplethmapbox(
+        geojson=hex_geojson(cells, HEX_SIZES[level]),
+        locations=hex_ids(cells),
+        z=cells[column],
+        colorscale="Viridis",
+        marker_opacity=0.7,
+        marker_line_width=0,
+        colorbar=dict(title=title),
+        hovertext=hovertext,
+        hoverinfo='text',
+        name='Wells (hexagons)')
+
+
+@timed
+def render_map_ui(df, selected_group, group_col, point_budget=None, scheduler=None):
+    """Streamlit UI wrapper for map generation with layer toggles.
+
+    Returns the wells inside a lasso/box selection on the map, or None. With a
+    figure_scheduler.FigureScheduler the map is built concurrently with the
+    other figures and drawn by scheduler.render(); None is returned then.
+    """
+    import streamlit as st
     st.subheader("Map of Selected Wells")
 
     col1, col2, col3 = st.columns(3)
@@ -165,16 +234,101 @@ def render_map_ui(df, selected_group, group_col):
         show_amas = st.checkbox("Show AMAs & INAs", value=True)
     with col3:
         show_aquifers = st.checkbox("Show Aquifers", value=False)
+    region_legend = st.checkbox("List overlay regions in the legend", value=False,
+                                help="Draws one trace per region instead of a single GeoJSON layer.")
+    from decimation import DETAIL_ZOOM
+    zoom = st.slider("Map zoom", DEFAULT_MAP_ZOOM - 1, MAX_MAP_ZOOM, DEFAULT_MAP_ZOOM, key="map_zoom",
+                     help=f"From zoom {DETAIL_ZOOM} individual wells are drawn instead of density cells.")
 
-    fig = plot_wells_on_map(df, selected_group, group_col,
-                            show_subbasin=show_subbasin,
-                            show_amas=show_amas,
-                            show_aquifers=show_aquifers)
+    # Statewide views default to hexagons: a few hundred cells instead of every well
+    hex_value, hex_stat = None, "median"
+    if st.checkbox("Aggregate wells into hexagons", value=selected_group is None, key="map_hexagons"):
+        from hexbin import HEX_STATS, HEX_VALUE_COLUMNS
+        value_columns, _ = get_available_columns()
+        hex_options = ["count"] + [c for c in HEX_VALUE_COLUMNS if c in value_columns]
+        col1, col2 = st.columns(2)
+        with col1:
+            hex_value = st.selectbox("Color hexagons by", hex_options,
+                                     format_func=lambda c: "Well count" if c == "count" else get_label(c))
+        with col2:
+            hex_stat = st.selectbox("Statistic", HEX_STATS, index=HEX_STATS.index("median"),
+                                    disabled=hex_value == "count")
 
-    st.plotly_chart(fig, use_container_width=True)
+    def build():
+        return plot_wells_on_map(df, selected_group, group_col,
+                                 show_subbasin=show_subbasin,
+                                 show_amas=show_amas,
+                                 show_aquifers=show_aquifers,
+                                 zoom=zoom,
+                                 point_budget=point_budget,
+                                 overlay_mode="traces" if region_legend else "layers",
+                                 hex_value=hex_value, hex_stat=hex_stat)
+
+    if scheduler is not None:
+        scheduler.submit("Map", build, lambda fig: _render_map(fig, selected_group, group_col, df, zoom))
+        return None
+    return _render_map(build(), selected_group, group_col, df, zoom)
+
+
+@timed
+def _render_map(fig, selected_group, group_col, data=None, zoom=DEFAULT_MAP_ZOOM):
+    """Draw the map and the summary of its lasso/box selection; return the selected wells of data."""
+    import streamlit as st
+    from decimation import hidden_points
+    event = st.plotly_chart(fig, use_container_width=True, key="well_map", on_select="rerun",
+                            selection_mode=("points", "box", "lasso"))
+    if hidden_points(fig):
+        st.caption(f"Level of detail: {hidden_points(fig):,} wells hidden.")
+
+    selected = map_selection(event.selection if event else None, selected_group, group_col, zoom=zoom, data=data)
+    if selected is not None:
+        st.markdown(f"**{len(selected):,} wells in the map selection**")
+        value_columns, _ = get_available_columns()
+        st.dataframe(selected[value_columns].describe().T)
+    return selected
+
+
+@timed
+def map_selection(selection, selected_group=None, group_col=None, zoom=DEFAULT_MAP_ZOOM, data=None):
+    """Wells inside a map lasso/box selection, or None if nothing is selected.
+
+    Mapbox selections reach Streamlit as the selected points: individual wells
+    are matched by objectid, while selected density cells are turned into the
+    hull of the cells and resolved through the spatial well index. data (the
+    wells the map shows, e.g. narrowed by attribute filters) defaults to the
+    shared dataset; only its wells are returned.
+    """
+    if not selection:
+        return None
+    import shapely
+    from datasets import get_wells
+    from decimation import cell_size_for_zoom
+    from spatial_join import get_well_index, selection_geometry
+    from well_functions import get_group_index
+    wells = get_wells()
+    points = selection.get("points", [])
+    objectids = [p["customdata"] for p in points if p.get("customdata") is not None]
+    geometry = selection_geometry(selection)
+    if geometry is None and not objectids:
+        cells = [(p["lon"], p["lat"]) for p in points if "lon" in p and "lat" in p]
+        if cells:
+            geometry = shapely.MultiPoint(cells).convex_hull.buffer(cell_size_for_zoom(zoom) / 2)
+    if geometry is not None:
+        positions = get_well_index().in_polygon(geometry)
+        selected = select_group(wells.take(positions), group_col, selected_group)
+    elif objectids:
+        selected = wells[wells['objectid'].isin(objectids)]
+    else:
+        return None
+    if data is not None and not get_group_index().covers(data):
+        # The spatial index covers the shared dataset; keep the wells of the filtered frame
+        selected = data[data['objectid'].isin(selected['objectid'])]
+    return selected
 
 
 if __name__ == "__main__":
+    import geopandas as gpd
+
     # Load each shapefile and print column names
     print("\n🧪 Subbasins:")
     gdf = gpd.read_file("shapefiles/ADWR Groundwater Subbasin.shp")
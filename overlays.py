@@ -0,0 +1,279 @@
+import json
+import os
+import tempfile
+import threading
+import numpy as np
+from profiling import timed
+
+# On-disk cache of reprojected, simplified overlay geometry
+CACHE_DIR = os.path.join(".cache", "overlays")
+CACHE_VERSION = 2
+
+# Overlay shapefiles and the column used to name each region
+OVERLAY_LAYERS = {
+    "subbasin": {"path": "shapefiles/ADWR Groundwater Subbasin.shp", "display_col": "subbasin_n"},
+    "amas": {"path": "shapefiles/AMAs_and_INAs.shp", "display_col": "basin_name"},
+    "aquifers": {"path": "shapefiles/Major_Aquifers.shp", "display_col": "aq_name"},
+}
+
+SHAPEFILE_PARTS = (".shp", ".shx", ".dbf", ".prj")
+
+# Coordinate precision of GeoJSON overlays (4 decimals is about 10 m, finer than the simplification)
+GEOJSON_DECIMALS = 4
+
+# In-process cache: (layer, zoom) -> overlay dict, (layer, zoom, "geojson") -> FeatureCollection
+_overlay_cache = {}
+_lock = threading.Lock()
+
+# Cache key -> lock held while that artifact is built, so concurrent callers build it once
+_build_locks = {}
+
+
+def _build_lock(key):
+    with _lock:
+        return _build_locks.setdefault(key, threading.Lock())
+
+
+def _cached(key, fingerprint):
+    with _lock:
+        cached = _overlay_cache.get(key)
+    return cached[1] if cached is not None and cached[0] == fingerprint else None
+
+
+def _store(key, fingerprint, value):
+    with _lock:
+        _overlay_cache[key] = (fingerprint, value)
+
+
+def tolerance_for_zoom(zoom):
+    """Simplification tolerance (degrees) of roughly half a screen pixel at a mapbox zoom level."""
+    return 360.0 / (256 * 2 ** zoom) / 2
+
+
+def source_fingerprint(path):
+    """Fingerprint a shapefile from the size and mtime of its component files."""
+    base, _ = os.path.splitext(path)
+    parts = []
+    for ext in SHAPEFILE_PARTS:
+        part = base + ext
+        if os.path.exists(part):
+            stat = os.stat(part)
+            parts.append(f"{ext}:{stat.st_size}:{stat.st_mtime_ns}")
+    return f"v{CACHE_VERSION};" + ";".join(parts)
+
+
+def _polygon_parts(geom):
+    if geom is None or geom.is_empty:
+        return []
+    if geom.geom_type == 'Polygon':
+        return [geom]
+    if geom.geom_type == 'MultiPolygon':
+        return list(geom.geoms)
+    return []
+
+
+def _read_layer(layer, zoom):
+    """Read, reproject and simplify an overlay; return it with the normalized and display names."""
+    import geopandas as gpd
+
+    spec = OVERLAY_LAYERS[layer]
+    gdf = gpd.read_file(spec["path"]).to_crs("EPSG:4326")
+    gdf.columns = gdf.columns.str.strip().str.lower()
+    display_col = spec["display_col"]
+    gdf = gdf[gdf[display_col].notna()]
+    gdf["geometry"] = gdf.geometry.simplify(tolerance_for_zoom(zoom), preserve_topology=True)
+
+    name_norm = gdf[display_col].str.strip().str.lower()
+    # Last spelling seen for a normalized name is the one displayed
+    name_map = dict(zip(name_norm, gdf[display_col]))
+    return gdf, name_norm, name_map
+
+
+def build_overlay(layer, zoom=5):
+    """Read, reproject and simplify one overlay layer, merging rings per named region.
+
+    Returns a dict with 'names' (display names), 'offsets' (start of each region
+    in the coordinate arrays) and float32 'lon'/'lat' arrays where the rings of
+    a region are separated by NaN gaps.
+    """
+    gdf, name_norm, name_map = _read_layer(layer, zoom)
+
+    names, offsets, lon_parts, lat_parts = [], [], [], []
+    size = 0
+    for norm, geoms in gdf.geometry.groupby(name_norm, sort=False):
+        rings = []
+        for geom in geoms:
+            for poly in _polygon_parts(geom):
+                coords = np.asarray(poly.exterior.coords)
+                rings.append(coords[:, :2])
+                rings.append(np.full((1, 2), np.nan))
+        if not rings:
+            continue
+        coords = np.concatenate(rings[:-1])
+        names.append(name_map[norm])
+        offsets.append(size)
+        lon_parts.append(coords[:, 0])
+        lat_parts.append(coords[:, 1])
+        size += len(coords)
+    offsets.append(size)
+
+    return {
+        "names": np.array(names, dtype=str),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "lon": np.concatenate(lon_parts).astype(np.float32) if lon_parts else np.empty(0, np.float32),
+        "lat": np.concatenate(lat_parts).astype(np.float32) if lat_parts else np.empty(0, np.float32),
+    }
+
+
+def _ring_coordinates(ring):
+    return np.round(np.asarray(ring.coords)[:, :2], GEOJSON_DECIMALS).tolist()
+
+
+def build_overlay_geojson(layer, zoom=5):
+    """Build one overlay layer as a GeoJSON FeatureCollection, one MultiPolygon feature per named region.
+
+    Unlike build_overlay, interior rings are kept so holes render correctly.
+    Each feature carries its display 'name' in its properties.
+    """
+    gdf, name_norm, name_map = _read_layer(layer, zoom)
+
+    features = []
+    for norm, geoms in gdf.geometry.groupby(name_norm, sort=False):
+        polygons = []
+        for geom in geoms:
+            for poly in _polygon_parts(geom):
+                polygons.append([_ring_coordinates(poly.exterior)] + [_ring_coordinates(r) for r in poly.interiors])
+        if not polygons:
+            continue
+        features.append({
+            "type": "Feature",
+            "id": len(features),
+            "properties": {"name": str(name_map[norm])},
+            "geometry": {"type": "MultiPolygon", "coordinates": polygons},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _cache_path(layer, zoom):
+    return os.path.join(CACHE_DIR, f"{layer}_z{zoom}.npz")
+
+
+def _read_cached(path, fingerprint):
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["fingerprint"]) != fingerprint:
+                return None
+            return {key: data[key] for key in ("names", "offsets", "lon", "lat")}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_cached(path, overlay, fingerprint):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A unique temp file per writer, so concurrent threads and processes never share one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.savez(f, fingerprint=np.array(fingerprint), **overlay)
+    # Atomic so concurrent server processes never read a half-written file
+    os.replace(tmp_path, path)
+
+
+@timed
+def load_overlay(layer, zoom=5):
+    """Return a cached overlay layer, rebuilding it if its shapefile has changed."""
+    zoom = int(min(max(zoom, 0), 14))
+    fingerprint = source_fingerprint(OVERLAY_LAYERS[layer]["path"])
+
+    key = (layer, zoom)
+    overlay = _cached(key, fingerprint)
+    if overlay is not None:
+        return overlay
+
+    from shared_store import shared_overlay
+    with _build_lock(key):
+        # Another thread may have built it while this one waited
+        overlay = _cached(key, fingerprint)
+        if overlay is not None:
+            return overlay
+        path = _cache_path(layer, zoom)
+        overlay = shared_overlay(layer, zoom, fingerprint) or _read_cached(path, fingerprint)
+        if overlay is None:
+            overlay = build_overlay(layer, zoom)
+            _write_cached(path, overlay, fingerprint)
+        _store(key, fingerprint, overlay)
+    return overlay
+
+
+def _read_cached_geojson(path, fingerprint):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cached["geojson"] if cached.get("fingerprint") == fingerprint else None
+
+
+def _write_cached_geojson(path, geojson, fingerprint):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump({"fingerprint": fingerprint, "geojson": geojson}, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+@timed
+def load_overlay_geojson(layer, zoom=5):
+    """Return a cached GeoJSON overlay layer (see build_overlay_geojson)."""
+    zoom = int(min(max(zoom, 0), 14))
+    fingerprint = source_fingerprint(OVERLAY_LAYERS[layer]["path"])
+
+    key = (layer, zoom, "geojson")
+    geojson = _cached(key, fingerprint)
+    if geojson is not None:
+        return geojson
+
+    from shared_store import shared_geojson
+    with _build_lock(key):
+        geojson = _cached(key, fingerprint)
+        if geojson is not None:
+            return geojson
+        path = os.path.join(CACHE_DIR, f"{layer}_z{zoom}.geojson")
+        geojson = shared_geojson(layer, zoom, fingerprint) or _read_cached_geojson(path, fingerprint)
+        if geojson is None:
+            geojson = build_overlay_geojson(layer, zoom)
+            _write_cached_geojson(path, geojson, fingerprint)
+        _store(key, fingerprint, geojson)
+    return geojson
+
+
+def iter_regions(overlay):
+    """Yield (name, lon, lat) for each named region of an overlay."""
+    offsets = overlay["offsets"]
+    for i, name in enumerate(overlay["names"]):
+        start, end = offsets[i], offsets[i + 1]
+        yield str(name), overlay["lon"][start:end], overlay["lat"][start:end]
+
+
+def clear_overlay_cache(remove_files=False):
+    """Drop the in-process overlay cache and optionally the on-disk artifacts."""
+    with _lock:
+        _overlay_cache.clear()
+    if remove_files and os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith((".npz", ".geojson")):
+                os.remove(os.path.join(CACHE_DIR, name))
+
+
+if __name__ == "__main__":
+    # Prebuild the default-zoom caches for every overlay
+    import time
+    for layer in OVERLAY_LAYERS:
+        start = time.perf_counter()
+        overlay = load_overlay(layer)
+        geojson = load_overlay_geojson(layer)
+        print(f"{layer}: {len(overlay['names'])} regions, {len(overlay['lon'])} vertices, "
+              f"{len(geojson['features'])} GeoJSON features in {time.perf_counter() - start:.3f}s")
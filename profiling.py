@@ -0,0 +1,225 @@
+"""
+Per-rerun timing instrumentation for the Streamlit app.
+
+Functions decorated with @timed (and blocks wrapped in span()) record wall
+time, rows processed, peak Python memory and payload bytes while a profiling
+run is active. Outside a run the decorators only check a context variable, so
+they cost next to nothing when the debug panel is off.
+
+Finished runs are appended as JSON lines to PROFILE_LOG.
+"""
+import base64
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_LOG = os.environ.get("WELL_EXPLORER_PROFILE_LOG", ".cache/profile.jsonl")
+
+# Set WELL_EXPLORER_PROFILE=1 to start the app with the profiling panel on
+PROFILE_DEFAULT = os.environ.get("WELL_EXPLORER_PROFILE", "") not in ("", "0")
+
+# The active run (None when profiling is off); context variables follow the
+# Streamlit script thread and any copied contexts handed to worker threads
+_current_run = contextvars.ContextVar("profiling_run", default=None)
+
+# Number of runs in progress across sessions; tracemalloc only runs while > 0
+_active_runs = 0
+_lock = threading.Lock()
+
+
+class ProfileRun:
+    """Records collected during one rerun of the app."""
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.time()
+        self.records = []
+        self._stack = []
+
+    def enter(self, name):
+        # Fold the peak seen so far into the enclosing frame before resetting it
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        # Records are listed in call order, so a caller precedes its callees
+        record = {'name': name, 'depth': len(self._stack)}
+        self.records.append(record)
+        frame = {'start_mem': current, 'peak': current, 'record': record}
+        self._stack.append(frame)
+        return frame
+
+    def exit(self, frame, wall_s, rows=None, payload_bytes=None, extra=None):
+        _, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, frame['peak'])
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+        frame['record'].update({
+            'wall_ms': round(wall_s * 1000, 3),
+            'rows': rows,
+            'peak_mb': round((peak - frame['start_mem']) / 1e6, 3),
+            'payload_bytes': payload_bytes,
+        })
+        if extra:
+            frame['record'].update(extra)
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame(self.records, columns=['name', 'depth', 'wall_ms', 'rows', 'peak_mb', 'payload_bytes'])
+
+
+def _length(values):
+    """Length of trace data, including base64 typed arrays from deserialized figures."""
+    if isinstance(values, dict) and 'bdata' in values:
+        import numpy as np
+        if 'shape' in values:
+            return int(str(values['shape']).split(',')[0])
+        return len(base64.b64decode(values['bdata'])) // np.dtype(values['dtype']).itemsize
+    return len(values)
+
+
+def _rows(result, args):
+    """Rows a call processed: its DataFrame/Series result, figure points or first frame argument."""
+    # pandas is imported here so that importing this module stays cheap
+    import pandas as pd
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    data = getattr(result, 'data', None)
+    if isinstance(data, tuple):
+        rows = 0
+        for trace in data:
+            values = next((v for v in (getattr(trace, a, None) for a in ('x', 'y', 'lat')) if v is not None), ())
+            rows += _length(values)
+        return rows
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            return len(arg)
+    return None
+
+
+def _payload(result):
+    """Serialized size of a figure or bytes result, and the time taken to serialize it."""
+    if isinstance(result, (bytes, bytearray)):
+        return len(result), None
+    if hasattr(result, 'to_json') and hasattr(result, 'layout'):
+        start = time.perf_counter()
+        size = len(result.to_json())
+        return size, round((time.perf_counter() - start) * 1000, 3)
+    return None, None
+
+
+def timed(func=None, name=None):
+    """Decorator recording each call of func in the active profiling run."""
+    if func is None:
+        return functools.partial(timed, name=name)
+    label = name or f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        run = _current_run.get()
+        if run is None:
+            return func(*args, **kwargs)
+        frame = run.enter(label)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            run.exit(frame, time.perf_counter() - start, extra={'error': True})
+            raise
+        wall_s = time.perf_counter() - start
+        payload_bytes, serialize_ms = _payload(result)
+        run.exit(frame, wall_s, rows=_rows(result, args), payload_bytes=payload_bytes,
+                 extra={'serialize_ms': serialize_ms} if serialize_ms is not None else None)
+        return result
+    return wrapper
+
+
+@contextmanager
+def span(name, rows=None):
+    """Record a block of code in the active profiling run.
+
+    Yields a dict whose 'rows' and 'payload_bytes' entries may be filled in
+    by the block.
+    """
+    run = _current_run.get()
+    info = {'rows': rows, 'payload_bytes': None}
+    if run is None:
+        yield info
+        return
+    frame = run.enter(name)
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        run.exit(frame, time.perf_counter() - start, rows=info['rows'], payload_bytes=info['payload_bytes'])
+
+
+def _release():
+    global _active_runs
+    _current_run.set(None)
+    with _lock:
+        _active_runs -= 1
+        if _active_runs == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def start_run(enabled=True, label="rerun"):
+    """Start recording a profiling run in the current context and return it.
+
+    With enabled=False any run left over from an interrupted rerun is
+    discarded and None is returned, so instrumented calls stay no-ops.
+    """
+    global _active_runs
+    stale = _current_run.get()
+    if stale is not None:
+        _release()
+    if not enabled:
+        return None
+    with _lock:
+        _active_runs += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    run = ProfileRun(label)
+    _current_run.set(run)
+    return run
+
+
+def current_run():
+    """The run recording in the current context, or None when profiling is off."""
+    return _current_run.get()
+
+
+def finish_run(log_path=PROFILE_LOG):
+    """Stop the active run, append it to the JSON-lines log and return it (None if none was active)."""
+    run = _current_run.get()
+    if run is None:
+        return None
+    _release()
+    total_ms = round((time.time() - run.started) * 1000, 3)
+    if log_path:
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        with open(log_path, "a") as f:
+            for record in run.records:
+                f.write(json.dumps({'run': run.label, 'started': run.started, 'total_ms': total_ms, **record}) + "\n")
+    return run
+
+
+def render_profile_panel(run):
+    """Sidebar table of the calls recorded during this rerun."""
+    import streamlit as st
+    with st.sidebar.expander("Profiling (this rerun)", expanded=True):
+        if run is None or not run.records:
+            st.caption("No instrumented calls recorded.")
+            return
+        table = run.to_frame()
+        table['name'] = ["· " * depth + name for depth, name in zip(table['depth'], table['name'])]
+        top_level = table[table['depth'] == 0]
+        st.caption(f"{len(table)} calls, {top_level['wall_ms'].sum():,.0f} ms in top-level calls. "
+                   f"Logged to {PROFILE_LOG}.")
+        st.dataframe(table.drop(columns='depth'), hide_index=True)
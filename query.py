@@ -0,0 +1,230 @@
+"""
+Attribute filters evaluated inside the Parquet scan.
+
+A WellFilter combines range predicates (well_depth, wl_dtw, drill_date,
+lastwldate, age_min/age_max, ...) with categorical predicates. It is
+compiled into a pyarrow.dataset expression, so Parquet row-group statistics
+skip data that cannot match. Only the requested columns are read.
+
+Filters query the same flat wells file (datasets.WELLS_PATH) the unfiltered
+views load, so switching a filter on or off never changes the data source.
+`ingest.py --flat` rewrites that file from the partitioned datasets, one
+partition per run of row groups, so basin predicates still prune.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import streamlit as st
+
+from datasets import (DERIVED_WELL_COLUMNS, JOINED_METADATA_COLUMNS, WELLS_PATH, dataset_version,
+                      get_metadata, table_to_frame)
+from group_index import normalize_group
+from profiling import timed
+
+# Columns offered as range filters
+RANGE_COLUMNS = ['well_depth', 'wl_dtw', 'wl_elev', 'drill_date', 'lastwldate', 'age_min', 'age_max']
+
+# Number of query results kept in memory
+QUERY_CACHE_ENTRIES = 16
+
+_datasets = {}
+_distinct = {}
+_results = OrderedDict()
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class WellFilter:
+    """Hashable set of predicates on the wells table.
+
+    ranges: ((column, low, high), ...) with None for an open bound.
+    categories: ((column, (value, ...)), ...) matched ignoring case and
+    surrounding spaces.
+    """
+    ranges: tuple = ()
+    categories: tuple = ()
+
+    @classmethod
+    def from_dict(cls, ranges=None, categories=None):
+        ranges = tuple(sorted((col, lo, hi) for col, (lo, hi) in (ranges or {}).items()
+                              if lo is not None or hi is not None))
+        categories = tuple(sorted((col, tuple(sorted(values))) for col, values in (categories or {}).items()
+                                  if values))
+        return cls(ranges, categories)
+
+    def __bool__(self):
+        return bool(self.ranges or self.categories)
+
+    def columns(self):
+        return [col for col, _, _ in self.ranges] + [col for col, _ in self.categories]
+
+
+def source_version():
+    """Version stamp of the queried data, for keying results and figures built from filtered wells."""
+    return dataset_version(WELLS_PATH)
+
+
+def get_dataset():
+    """Return the pyarrow dataset over the wells (rebuilt when the files change)."""
+    version = source_version()
+    with _lock:
+        cached = _datasets.get('wells')
+        if cached is None or cached[0] != version:
+            cached = (version, ds.dataset(WELLS_PATH, format="parquet"))
+            _datasets['wells'] = cached
+            _distinct.clear()
+        return cached[1]
+
+
+def _stored_names(dataset):
+    return {name.lower().strip(): name for name in dataset.schema.names}
+
+
+def _stored_values(dataset, stored, values):
+    """Map normalized category values to their stored spellings, so predicates stay exact.
+
+    The distinct values of each column are read once per dataset version.
+    """
+    with _lock:
+        spellings = _distinct.get(stored)
+    if spellings is None:
+        distinct = pc.unique(dataset.to_table(columns=[stored])[stored]).to_pylist()
+        spellings = {}
+        for value in distinct:
+            if value is not None:
+                spellings.setdefault(normalize_group(value), []).append(value)
+        with _lock:
+            _distinct[stored] = spellings
+    return [spelling for value in values for spelling in spellings.get(normalize_group(value), [])]
+
+
+def _range_bound(field_type, value):
+    if pa.types.is_timestamp(field_type) or pa.types.is_date(field_type):
+        return pa.scalar(pd.Timestamp(value).to_pydatetime(), type=pa.timestamp('us')).cast(field_type)
+    return value
+
+
+def build_expression(filters, dataset=None):
+    """Compile a WellFilter into a pyarrow.dataset expression (None if it has no predicates)."""
+    dataset = dataset or get_dataset()
+    names = _stored_names(dataset)
+    expression = None
+    for col, lo, hi in filters.ranges:
+        stored = names[col]
+        field_type = dataset.schema.field(stored).type
+        if lo is not None:
+            term = ds.field(stored) >= _range_bound(field_type, lo)
+            expression = term if expression is None else expression & term
+        if hi is not None:
+            term = ds.field(stored) <= _range_bound(field_type, hi)
+            expression = term if expression is None else expression & term
+    for col, values in filters.categories:
+        stored = names[col]
+        spellings = pa.array(_stored_values(dataset, stored, values), type=dataset.schema.field(stored).type)
+        term = ds.field(stored).isin(spellings)
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def scan_stats(filters):
+    """How much of the dataset a filter reads: files and row groups before and after pruning."""
+    dataset = get_dataset()
+    expression = build_expression(filters, dataset)
+    fragments = list(dataset.get_fragments())
+    matched = list(dataset.get_fragments(filter=expression)) if expression is not None else fragments
+    row_groups = sum(f.num_row_groups for f in fragments)
+    matched_groups = sum(len(f.split_by_row_group(expression)) if expression is not None else f.num_row_groups
+                         for f in matched)
+    return {'files': len(fragments), 'files_read': len(matched),
+            'row_groups': row_groups, 'row_groups_read': matched_groups}
+
+
+@timed
+def run_query(filters, columns=None):
+    """Return the wells matching filters with only the requested columns.
+
+    Columns use the store's normalized names, including the derived 'x'/'y'
+    and the joined 'water_use' (see datasets.get_wells). Results are memoized
+    per data version.
+    """
+    dataset = get_dataset()
+    names = _stored_names(dataset)
+    available = list(names) + [c for c in list(DERIVED_WELL_COLUMNS) + JOINED_METADATA_COLUMNS if c not in names]
+    columns = available if columns is None else list(dict.fromkeys(columns))
+    unknown = [c for c in columns if c not in available]
+    if unknown:
+        raise KeyError(f"Columns not found in the wells dataset: {unknown}")
+
+    key = (source_version(), filters, tuple(columns))
+    with _lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+
+    read = [c for c in columns if c in names]
+    read += [DERIVED_WELL_COLUMNS[c] for c in columns if c in DERIVED_WELL_COLUMNS and c not in names]
+    joined = [c for c in columns if c in JOINED_METADATA_COLUMNS and c not in names]
+    if joined:
+        read.append('objectid')
+    read = list(dict.fromkeys(read))
+
+    table = dataset.to_table(columns=[names[c] for c in read], filter=build_expression(filters, dataset))
+    frame = table_to_frame(table)
+    added = {alias: frame[source] for alias, source in DERIVED_WELL_COLUMNS.items()
+             if alias in columns and alias not in frame.columns}
+    if joined:
+        lookup = get_metadata(['objectid'] + joined).set_index('objectid')
+        for col in joined:
+            added[col] = frame['objectid'].map(lookup[col]).astype(lookup[col].dtype)
+    frame = frame.assign(**added)[columns]
+
+    with _lock:
+        _results[key] = frame
+        while len(_results) > QUERY_CACHE_ENTRIES:
+            _results.popitem(last=False)
+    return frame
+
+
+def clear_query_cache():
+    with _lock:
+        _datasets.clear()
+        _distinct.clear()
+        _results.clear()
+
+
+def render_filter_ui(data, category_columns):
+    """Sidebar widgets for range and categorical filters; returns the WellFilter (empty if unchanged)."""
+    ranges, categories = {}, {}
+    with st.sidebar.expander("Attribute Filters"):
+        for col in RANGE_COLUMNS:
+            values = data[col].dropna()
+            if values.empty:
+                continue
+            lo, hi = values.min(), values.max()
+            if pd.api.types.is_datetime64_any_dtype(values):
+                picked = st.date_input(col.replace('_', ' ').title(), value=(lo.date(), hi.date()),
+                                       min_value=lo.date(), max_value=hi.date(), key=f"filter_{col}")
+                if len(picked) == 2 and (picked[0] > lo.date() or picked[1] < hi.date()):
+                    ranges[col] = (str(picked[0]), f"{picked[1]} 23:59:59")
+            else:
+                lo, hi = float(lo), float(hi)
+                picked = st.slider(col.replace('_', ' ').title(), lo, hi, (lo, hi), key=f"filter_{col}")
+                if picked != (lo, hi):
+                    ranges[col] = (picked[0] if picked[0] > lo else None, picked[1] if picked[1] < hi else None)
+
+        category_col = st.selectbox("Category filter column", ["(none)"] + list(category_columns), key="filter_category_col")
+        if category_col != "(none)":
+            options = sorted(data[category_col].dropna().astype(str).str.strip().unique())
+            categories[category_col] = st.multiselect("Keep values", options, key="filter_category_values")
+
+    filters = WellFilter.from_dict(ranges, categories)
+    if filters:
+        stats = scan_stats(filters)
+        st.sidebar.caption(f"Filters read {stats['row_groups_read']} of {stats['row_groups']} row groups "
+                           f"in {stats['files_read']} of {stats['files']} files.")
+    return filters
@@ -0,0 +1,297 @@
+"""
+Shared-memory datasets for serving with several Streamlit processes.
+
+A loader process publishes the prepared data once into a directory on a
+memory-backed file system (/dev/shm by default):
+
+- the wells and metadata tables as uncompressed Arrow IPC files,
+- the simplified overlay arrays and GeoJSON for the published zoom levels,
+- the full-resolution join polygons and the state boundary as WKB.
+
+Workers started with WELL_EXPLORER_SHARED_DIR pointing at that directory
+memory-map the files instead of reading the parquet files and shapefiles.
+Table columns become pandas columns without a copy, so every worker maps the
+same physical pages and adding a worker does not add another copy of the
+data. Polygons still have to be turned into per-process GEOS objects, but
+workers skip geopandas, shapefile parsing and reprojection.
+
+Each entry records the version of the source it was built from, and a
+worker ignores any entry whose source has changed since it was published.
+
+    python shared_store.py publish [--dir /dev/shm/well-explorer] [--zooms 5]
+    python shared_store.py serve --workers 4 [--base-port 8501] [--dir ...]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+# Directory a worker attaches to (unset: every process reads the source files itself)
+SHARED_DIR = os.environ.get("WELL_EXPLORER_SHARED_DIR") or None
+DEFAULT_PUBLISH_DIR = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else "/tmp", "well-explorer")
+
+MANIFEST = "manifest.json"
+
+# Overlay zoom levels published by default (the app's initial map zoom)
+PUBLISH_ZOOMS = [5]
+
+# Smallest int64, which pandas reads as NaT
+_NAT = -2 ** 63
+
+# manifest file stamp -> manifest, and file -> memory-mapped object
+_manifest = None
+_mapped = {}
+_lock = threading.Lock()
+
+
+def _read_manifest(directory):
+    global _manifest
+    path = os.path.join(directory, MANIFEST)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if _manifest is None or _manifest[0] != (directory, stamp):
+            with open(path) as f:
+                _manifest = ((directory, stamp), json.load(f))
+            _mapped.clear()
+        return _manifest[1]
+
+
+def shared_file(key, version, directory=None):
+    """Path of the file published for key if it was built from `version`, else None."""
+    directory = directory or SHARED_DIR
+    if directory is None:
+        return None
+    manifest = _read_manifest(directory)
+    entry = (manifest or {}).get("entries", {}).get(key)
+    if entry is None or entry["version"] != version:
+        return None
+    return os.path.join(directory, entry["file"])
+
+
+def _map_table(path):
+    """Arrow table backed by a memory map of an IPC file (opened once per process)."""
+    import pyarrow as pa
+    with _lock:
+        table = _mapped.get(path)
+        if table is None:
+            table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+            _mapped[path] = table
+        return table
+
+
+def _table_key(path):
+    return f"table:{os.path.realpath(path)}"
+
+
+def shared_table(path, version):
+    """Memory-mapped copy of a dataset file at `version`, or None when it is not published or is stale."""
+    if SHARED_DIR is None:
+        return None
+    published = shared_file(_table_key(path), version)
+    return _map_table(published) if published else None
+
+
+def shared_overlay(layer, zoom, fingerprint):
+    """Overlay arrays (see overlays.build_overlay) from the shared directory, or None."""
+    if SHARED_DIR is None:
+        return None
+    published = shared_file(f"overlay:{layer}:{zoom}", fingerprint)
+    if published is None:
+        return None
+    import numpy as np
+    table = _map_table(published)
+    meta = json.loads(table.schema.metadata[b"overlay"])
+    return {
+        "names": np.array(meta["names"], dtype=str),
+        "offsets": np.array(meta["offsets"], dtype=np.int64),
+        "lon": table["lon"].to_numpy(),
+        "lat": table["lat"].to_numpy(),
+    }
+
+
+def shared_geojson(layer, zoom, fingerprint):
+    """GeoJSON overlay from the shared directory, or None."""
+    if SHARED_DIR is None:
+        return None
+    published = shared_file(f"geojson:{layer}:{zoom}", fingerprint)
+    if published is None:
+        return None
+    with open(published) as f:
+        return json.load(f)
+
+
+def shared_geometries(path, fingerprint):
+    """(geometries, attributes DataFrame) published for a shapefile, or None."""
+    if SHARED_DIR is None:
+        return None
+    published = shared_file(f"geometries:{path}", fingerprint)
+    if published is None:
+        return None
+    import shapely
+    table = _map_table(published)
+    geometries = shapely.from_wkb(table["geometry"].to_numpy(zero_copy_only=False))
+    return geometries, table.drop_columns(["geometry"]).to_pandas()
+
+
+def zero_copy_table(table):
+    """Replace nulls with the sentinels pandas uses, so to_pandas can wrap the buffers.
+
+    Floats get NaN and timestamps NaT. String columns need nothing, since
+    Arrow-backed pandas strings wrap the Arrow data as is. Integers with nulls
+    are left alone since pandas copies them either way (into float64, or into
+    a nullable integer for the narrow ones of datasets.compact_table).
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    columns = []
+    for column in table.columns:
+        if column.null_count:
+            if pa.types.is_floating(column.type):
+                column = pc.fill_null(column, float("nan"))
+            elif pa.types.is_timestamp(column.type):
+                column = pc.fill_null(column.cast(pa.int64()), _NAT).cast(column.type)
+        columns.append(column)
+    return pa.table(columns, names=table.column_names)
+
+
+def _write_table(table, path):
+    import pyarrow as pa
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _write_json(data, path):
+    with open(path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+
+
+def _geometry_table(geometries, attributes):
+    import pyarrow as pa
+    import shapely
+    table = pa.Table.from_pandas(attributes.reset_index(drop=True), preserve_index=False)
+    return table.append_column("geometry", pa.array(shapely.to_wkb(geometries), type=pa.binary()))
+
+
+def publish(directory=DEFAULT_PUBLISH_DIR, zooms=PUBLISH_ZOOMS):
+    """Write the prepared datasets and geometry into directory and return the manifest.
+
+    Files of a publish get a fresh suffix and the manifest is replaced last, so
+    workers attached to an earlier publish keep their mappings and never see a
+    half-written one. Files of the previous manifest that the new one no longer
+    references are removed; nothing else in directory is deleted.
+    """
+    import pyarrow as pa
+    from datasets import DERIVED_WELL_COLUMNS, METADATA_PATH, WELLS_PATH, dataset_version, get_metadata, get_wells
+    from mapping import AZ_BOUNDARY_PATH, get_az_boundary
+    from overlays import OVERLAY_LAYERS, load_overlay, load_overlay_geojson, source_fingerprint
+    from spatial_join import JOIN_LAYERS, get_layer
+
+    os.makedirs(directory, exist_ok=True)
+    previous = _read_manifest(directory) or {}
+    suffix = uuid.uuid4().hex[:8]
+    entries = {}
+
+    def add(key, version, name, write):
+        file = f"{name}.{suffix}"
+        write(os.path.join(directory, file))
+        entries[key] = {"file": file, "version": version}
+
+    # The wells are published with their joined columns; x/y stay aliases added on load
+    wells = get_wells([c for c in get_wells().columns if c not in DERIVED_WELL_COLUMNS])
+    for path, frame in ((WELLS_PATH, wells), (METADATA_PATH, get_metadata())):
+        table = zero_copy_table(pa.Table.from_pandas(frame, preserve_index=False))
+        add(_table_key(path), dataset_version(path), os.path.basename(path) + ".arrow",
+            lambda out, table=table: _write_table(table, out))
+
+    for layer, spec in OVERLAY_LAYERS.items():
+        fingerprint = source_fingerprint(spec["path"])
+        for zoom in zooms:
+            overlay = load_overlay(layer, zoom)
+            meta = {"names": overlay["names"].tolist(), "offsets": overlay["offsets"].tolist()}
+            table = pa.table({"lon": overlay["lon"], "lat": overlay["lat"]}).replace_schema_metadata(
+                {"overlay": json.dumps(meta)})
+            add(f"overlay:{layer}:{zoom}", fingerprint, f"overlay_{layer}_z{zoom}.arrow",
+                lambda out, table=table: _write_table(table, out))
+            geojson = load_overlay_geojson(layer, zoom)
+            add(f"geojson:{layer}:{zoom}", fingerprint, f"overlay_{layer}_z{zoom}.geojson",
+                lambda out, geojson=geojson: _write_json(geojson, out))
+
+    for name, spec in JOIN_LAYERS.items():
+        layer = get_layer(name)
+        table = _geometry_table(layer.geometries, layer.attributes)
+        add(f"geometries:{spec['path']}", source_fingerprint(spec["path"]), f"layer_{name}.arrow",
+            lambda out, table=table: _write_table(table, out))
+    boundary = get_az_boundary()
+    table = _geometry_table(boundary.geometry.to_numpy(), boundary.drop(columns="geometry"))
+    add(f"geometries:{AZ_BOUNDARY_PATH}", source_fingerprint(AZ_BOUNDARY_PATH), "az_boundary.arrow",
+        lambda out: _write_table(table, out))
+
+    manifest = {"created": time.time(), "entries": entries}
+    tmp_path = os.path.join(directory, f"{MANIFEST}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+    # Only files of the previous publish are removed, so other files in directory are never touched.
+    # Unlinking is safe for attached workers: their mappings keep the old pages
+    referenced = {entry["file"] for entry in entries.values()}
+    for entry in previous.get("entries", {}).values():
+        if entry["file"] not in referenced:
+            try:
+                os.remove(os.path.join(directory, os.path.basename(entry["file"])))
+            except FileNotFoundError:
+                pass
+    return manifest
+
+
+def serve(workers, base_port=8501, directory=DEFAULT_PUBLISH_DIR, args=()):
+    """Publish, then run `workers` Streamlit servers on consecutive ports attached to the store.
+
+    Put a load balancer in front of the ports; this call returns when every
+    server has exited.
+    """
+    publish(directory)
+    env = dict(os.environ, WELL_EXPLORER_SHARED_DIR=os.path.abspath(directory))
+    processes = [
+        subprocess.Popen([sys.executable, "-m", "streamlit", "run", "main.py",
+                          "--server.port", str(base_port + i), "--server.headless", "true", *args], env=env)
+        for i in range(workers)
+    ]
+    try:
+        for process in processes:
+            process.wait()
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish shared-memory datasets and run several servers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    publish_parser = sub.add_parser("publish", help="Write the shared datasets")
+    publish_parser.add_argument("--dir", default=DEFAULT_PUBLISH_DIR)
+    publish_parser.add_argument("--zooms", default=",".join(map(str, PUBLISH_ZOOMS)),
+                                help="Comma-separated overlay zoom levels")
+    serve_parser = sub.add_parser("serve", help="Publish, then start worker servers attached to it")
+    serve_parser.add_argument("--workers", type=int, default=2)
+    serve_parser.add_argument("--base-port", type=int, default=8501)
+    serve_parser.add_argument("--dir", default=DEFAULT_PUBLISH_DIR)
+    args, extra = parser.parse_known_args()
+
+    if args.command == "publish":
+        start = time.perf_counter()
+        manifest = publish(args.dir, [int(z) for z in args.zooms.split(",")])
+        size = sum(os.path.getsize(os.path.join(args.dir, e["file"])) for e in manifest["entries"].values())
+        print(f"Published {len(manifest['entries'])} entries ({size / 1e6:.1f} MB) to {args.dir} "
+              f"in {time.perf_counter() - start:.2f}s")
+    else:
+        serve(args.workers, args.base_port, args.dir, extra)
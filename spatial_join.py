@@ -0,0 +1,187 @@
+"""
+STRtree-backed spatial joins between wells and the overlay shapefiles.
+
+Assigns subbasin, AMA/INA and aquifer attributes to arbitrary points, and
+answers "wells within polygon / bbox / radius" queries against the shared
+wells dataset without scanning every well.
+
+Usage:
+    python spatial_join.py wells.parquet enriched.parquet [--lon-col dd_long] [--lat-col dd_lat]
+"""
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from datasets import dataset_version, get_wells
+
+# Polygon layers and the well columns filled from their attributes
+JOIN_LAYERS = {
+    "subbasin": {"path": "shapefiles/ADWR Groundwater Subbasin.shp",
+                 "columns": {"subbasin_n": "subbasin_name", "name_abbr": "name_abbr"}},
+    "amas": {"path": "shapefiles/AMAs_and_INAs.shp",
+             "columns": {"basin_name": "basin_name_1"}},
+    "aquifers": {"path": "shapefiles/Major_Aquifers.shp",
+                 "columns": {"aq_name": "aq_name"}},
+}
+
+# Points are joined in blocks of this size to bound temporary memory
+JOIN_BLOCK_ROWS = 1_000_000
+
+EARTH_RADIUS_KM = 6371.0088
+
+_layers = {}
+_well_index = None
+_lock = threading.Lock()
+
+
+class PolygonLayer:
+    """Full-resolution, prepared polygons of one overlay in EPSG:4326."""
+
+    def __init__(self, geometries, attributes):
+        self.geometries = np.asarray(geometries)
+        self.attributes = attributes.reset_index(drop=True)
+        shapely.prepare(self.geometries)
+
+    @classmethod
+    def from_shapefile(cls, path, columns):
+        """Load a layer from its shapefile, or from shared memory when it was published there."""
+        from overlays import source_fingerprint
+        from shared_store import shared_geometries
+        shared = shared_geometries(path, source_fingerprint(path))
+        if shared is not None:
+            return cls(*shared)
+        import geopandas as gpd
+        gdf = gpd.read_file(path).to_crs("EPSG:4326")
+        gdf.columns = gdf.columns.str.strip().str.lower()
+        gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+        attributes = gdf[list(columns)].rename(columns=columns)
+        return cls(gdf.geometry.to_numpy(), attributes)
+
+    def locate(self, x, y):
+        """Index of the first polygon containing each point (-1 if none)."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        result = np.full(len(x), -1, dtype=np.int64)
+        for start in range(0, len(x), JOIN_BLOCK_ROWS):
+            points = shapely.points(x[start:start + JOIN_BLOCK_ROWS], y[start:start + JOIN_BLOCK_ROWS])
+            # Query the (prepared) polygons against a tree of the points: a few
+            # hundred polygon predicates instead of one per point
+            poly_idx, point_idx = shapely.STRtree(points).query(self.geometries, predicate='intersects')
+            # Keep the first polygon per point when polygons overlap
+            order = np.lexsort((poly_idx, point_idx))
+            point_idx, poly_idx = point_idx[order], poly_idx[order]
+            first = np.unique(point_idx, return_index=True)[1]
+            result[start + point_idx[first]] = poly_idx[first]
+        return result
+
+    def join(self, x, y):
+        """Polygon attributes for each point (NaN where no polygon contains it)."""
+        located = self.locate(x, y)
+        joined = self.attributes.reindex(located).reset_index(drop=True)
+        return joined
+
+
+def get_layer(name):
+    """Return a JOIN_LAYERS polygon layer, loading it on first use."""
+    with _lock:
+        if name not in _layers:
+            spec = JOIN_LAYERS[name]
+            _layers[name] = PolygonLayer.from_shapefile(spec["path"], spec["columns"])
+        return _layers[name]
+
+
+def assign_regions(x, y, layers=None):
+    """Bulk-assign overlay attributes (subbasin_name, basin_name_1, ...) to points."""
+    layers = list(JOIN_LAYERS) if layers is None else layers
+    parts = [get_layer(name).join(x, y) for name in layers]
+    return pd.concat(parts, axis=1)
+
+
+def fill_regions(df, x_col='x', y_col='y', layers=None):
+    """Return df with missing overlay attributes filled in from the spatial join."""
+    assigned = assign_regions(df[x_col].to_numpy(dtype=float), df[y_col].to_numpy(dtype=float), layers)
+    assigned.index = df.index
+    filled = {}
+    for col in assigned.columns:
+        filled[col] = df[col].fillna(assigned[col]) if col in df.columns else assigned[col]
+    return df.assign(**filled)
+
+
+class WellIndex:
+    """STRtree over well locations for sub-linear spatial selection.
+
+    Query results are row positions into the frame the index was built from.
+    """
+
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        valid = ~(np.isnan(self.x) | np.isnan(self.y))
+        self._positions = np.flatnonzero(valid)
+        self.tree = shapely.STRtree(shapely.points(self.x[valid], self.y[valid]))
+
+    def _to_positions(self, tree_idx):
+        return np.sort(self._positions[tree_idx])
+
+    def in_bbox(self, min_x, min_y, max_x, max_y):
+        return self._to_positions(self.tree.query(shapely.box(min_x, min_y, max_x, max_y)))
+
+    def in_polygon(self, polygon):
+        return self._to_positions(self.tree.query(polygon, predicate='intersects'))
+
+    def within_radius(self, lon, lat, radius_km):
+        """Wells within radius_km (great-circle distance) of a point."""
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+        candidates = self.in_bbox(lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+        return candidates[haversine_km(lon, lat, self.x[candidates], self.y[candidates]) <= radius_km]
+
+
+def haversine_km(lon, lat, lons, lats):
+    lon, lat, lons, lats = map(np.radians, (lon, lat, lons, lats))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def get_well_index():
+    """Return the WellIndex over the shared wells dataset (rebuilt when the dataset changes)."""
+    global _well_index
+    version = dataset_version()
+    with _lock:
+        if _well_index is None or _well_index[0] != version:
+            wells = get_wells(['x', 'y'])
+            _well_index = (version, WellIndex(wells['x'], wells['y']))
+        return _well_index[1]
+
+
+def selection_geometry(selection):
+    """Build a query geometry from a Streamlit plotly selection (lasso or box), or None."""
+    if not selection:
+        return None
+    for lasso in selection.get("lasso", []):
+        if len(lasso.get("x", [])) >= 3:
+            return shapely.Polygon(list(zip(lasso["x"], lasso["y"])))
+    for box in selection.get("box", []):
+        if len(box.get("x", [])) >= 2:
+            return shapely.box(min(box["x"]), min(box["y"]), max(box["x"]), max(box["y"]))
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign overlay attributes to wells by location.")
+    parser.add_argument("source", help="Parquet file with well coordinates")
+    parser.add_argument("output", help="Parquet file to write")
+    parser.add_argument("--lon-col", default="dd_long")
+    parser.add_argument("--lat-col", default="dd_lat")
+    args = parser.parse_args()
+
+    wells = pd.read_parquet(args.source)
+    columns = {c.lower().strip(): c for c in wells.columns}
+    assigned = assign_regions(wells[columns[args.lon_col]], wells[columns[args.lat_col]])
+    for col in assigned.columns:
+        wells[col.upper()] = assigned[col].to_numpy()
+    wells.to_parquet(args.output, index=False)
+    print(f"Assigned {', '.join(assigned.columns)} to {len(wells)} wells -> {args.output}")
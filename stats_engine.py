@@ -0,0 +1,104 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# Statistics produced for every (value_col, group_col) pair, in describe() order
+STAT_COLUMNS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+QUANTILES = (0.25, 0.5, 0.75)
+
+# Above this many rows, quantiles default to the histogram sketch
+APPROX_QUANTILE_ROWS = 5_000_000
+SKETCH_BINS = 4096
+
+# (dataset version, group_col, value columns, approx) -> wide summary table
+_summary_cache = {}
+_lock = threading.Lock()
+
+
+def _sketch_quantiles(codes, values, n_groups, quantiles=QUANTILES, bins=SKETCH_BINS):
+    """Approximate per-group quantiles from one pass of (group, value-bin) counts.
+
+    Values are bucketed into `bins` equal-width bins over the column range, so
+    the error is at most one bin width. Returns an (n_groups, len(quantiles)) array.
+    """
+    valid = (codes >= 0) & ~np.isnan(values)
+    result = np.full((n_groups, len(quantiles)), np.nan)
+    if not valid.any():
+        return result
+    codes, values = codes[valid], values[valid]
+    lo, hi = values.min(), values.max()
+    width = (hi - lo) / bins if hi > lo else 1.0
+    bin_ids = np.minimum(((values - lo) / width).astype(np.int64), bins - 1)
+    hist = np.bincount(codes * bins + bin_ids, minlength=n_groups * bins).reshape(n_groups, bins)
+    cumulative = hist.cumsum(axis=1)
+    total = cumulative[:, -1]
+
+    def value_at_rank(rank):
+        found = np.argmax(cumulative > rank[:, None], axis=1)
+        return lo + (found + 0.5) * width
+
+    # Linear interpolation between ranks, matching pandas' default quantile method
+    for i, q in enumerate(quantiles):
+        position = q * np.maximum(total - 1, 0)
+        lower = np.floor(position)
+        upper = np.minimum(lower + 1, np.maximum(total - 1, 0))
+        frac = position - lower
+        estimate = value_at_rank(lower) * (1 - frac) + value_at_rank(upper) * frac
+        result[:, i] = np.where(total > 0, estimate, np.nan)
+    return result
+
+
+def summarize(df, group_col, value_cols, approx=False):
+    """Describe every value column by group_col in a single groupby pass.
+
+    Returns a frame indexed by group with (value_col, stat) columns. With
+    approx=True the quartiles come from a histogram sketch instead of a sort.
+    """
+    grouped = df.groupby(group_col, observed=True, sort=True)[list(value_cols)]
+    if not approx:
+        return grouped.describe()
+
+    aggregated = grouped.agg(['count', 'mean', 'std', 'min', 'max'])
+    groups = aggregated.index
+    codes = pd.Categorical(df[group_col], categories=groups).codes.astype(np.int64)
+    pieces = {}
+    for value_col in value_cols:
+        quantiles = _sketch_quantiles(codes, df[value_col].to_numpy(dtype=float), len(groups))
+        for stat in STAT_COLUMNS:
+            if stat in ('25%', '50%', '75%'):
+                pieces[(value_col, stat)] = quantiles[:, ('25%', '50%', '75%').index(stat)]
+            else:
+                pieces[(value_col, stat)] = aggregated[(value_col, stat)].to_numpy(dtype=float)
+    return pd.DataFrame(pieces, index=groups)
+
+
+def get_summary_table(df, group_col, value_cols, version, approx=None):
+    """Return the memoized summary of all value columns by group_col for a dataset version."""
+    if approx is None:
+        approx = len(df) > APPROX_QUANTILE_ROWS
+    key = (version, group_col, tuple(value_cols), approx)
+    with _lock:
+        table = _summary_cache.get(key)
+    if table is None:
+        table = summarize(df, group_col, value_cols, approx=approx)
+        with _lock:
+            _summary_cache[key] = table
+    return table
+
+
+def describe_group(table, value_col, group_col):
+    """Extract one value column from a summary table in groupby().describe().reset_index() form."""
+    result = table[value_col].reset_index()
+    result.columns = [group_col] + list(result.columns[1:])
+    return result
+
+
+def precompute(df, group_cols, value_cols, version, approx=None):
+    """Build the summary tables for every group column up front."""
+    for group_col in group_cols:
+        get_summary_table(df, group_col, value_cols, version, approx=approx)
+
+
+def clear_summary_cache():
+    with _lock:
+        _summary_cache.clear()
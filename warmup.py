@@ -0,0 +1,156 @@
+"""
+Background warm-up of the shared caches.
+
+start_warmup() launches one daemon thread per server process that loads
+the datasets and the group index, builds the overlay geometry, spatial index
+and summary tables, and renders the default figures into the figure cache.
+Sessions that need an artifact before it is ready simply build it
+themselves; warmup_status() reports progress for the sidebar.
+
+Run `python warmup.py` before starting the server to prebuild the on-disk
+caches (overlays) as well.
+"""
+import threading
+import time
+import traceback
+
+from decimation import DEFAULT_POINT_BUDGET
+
+# Value columns warmed, in order; the app's default (first) comes first
+WARMUP_VALUE_COLUMNS = ['well_depth', 'wl_dtw', 'wl_elev']
+
+_status = {}
+_thread = None
+_lock = threading.Lock()
+
+
+def _load_datasets():
+    from datasets import get_metadata, get_wells
+    get_wells()
+    get_metadata()
+
+
+def _build_group_index():
+    from well_functions import get_group_index
+    get_group_index()
+
+
+def _precompute_summaries():
+    import stats_engine
+    from datasets import dataset_version, get_wells
+    from well_functions import get_available_columns
+    value_columns, group_by_columns = get_available_columns()
+    stats_engine.precompute(get_wells(), group_by_columns, value_columns, dataset_version())
+
+
+def _build_overlays():
+    from overlays import OVERLAY_LAYERS, load_overlay, load_overlay_geojson
+    for layer in OVERLAY_LAYERS:
+        load_overlay(layer)
+        load_overlay_geojson(layer)
+
+
+def _load_map():
+    from mapping import get_az_boundary
+    from spatial_join import get_well_index
+    get_az_boundary()
+    get_well_index()
+
+
+def _build_hex_pyramid():
+    from datasets import dataset_version, get_wells
+    from hexbin import HEX_VALUE_COLUMNS, get_hex_pyramid
+    wells = get_wells()
+    get_hex_pyramid(wells, [c for c in HEX_VALUE_COLUMNS if c in wells.columns], dataset_version())
+
+
+def _figure_task(value_col, group_col):
+    def build():
+        from well_functions import make_boxplot, make_histogram, make_scatter_xyz
+        # Same arguments as main.py's default view, so the figure cache keys match
+        make_boxplot(value_col, group_col, None)
+        make_histogram(value_col, None, group_col)
+        make_scatter_xyz(value_col, None, group_col, point_budget=DEFAULT_POINT_BUDGET)
+    return build
+
+
+def warmup_tasks():
+    """(name, callable) pairs in the order they are warmed."""
+    from well_functions import get_available_columns
+    tasks = [
+        ("datasets", _load_datasets),
+        ("group index", _build_group_index),
+        ("summary statistics", _precompute_summaries),
+        ("overlays", _build_overlays),
+        ("map", _load_map),
+        ("hexagon pyramid", _build_hex_pyramid),
+    ]
+    _, group_by_columns = get_available_columns()
+    for value_col in WARMUP_VALUE_COLUMNS:
+        for group_col in group_by_columns:
+            tasks.append((f"figures: {value_col} by {group_col}", _figure_task(value_col, group_col)))
+    return tasks
+
+
+def run_warmup(tasks=None, verbose=False):
+    """Run the warm-up tasks in order, recording each one's state and duration."""
+    tasks = warmup_tasks() if tasks is None else tasks
+    with _lock:
+        for name, _ in tasks:
+            _status.setdefault(name, {"state": "pending"})
+    for name, task in tasks:
+        with _lock:
+            _status[name] = {"state": "running"}
+        start = time.perf_counter()
+        try:
+            task()
+            state = {"state": "done"}
+        except Exception:
+            state = {"state": "failed", "error": traceback.format_exc(limit=3)}
+        state["seconds"] = round(time.perf_counter() - start, 3)
+        with _lock:
+            _status[name] = state
+        if verbose:
+            print(f"{name}: {state['state']} in {state['seconds']:.2f}s")
+
+
+def start_warmup():
+    """Start the warm-up thread once per process; later calls are no-ops."""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return _thread
+        _thread = threading.Thread(target=run_warmup, name="cache-warmup", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def warmup_status():
+    """Copy of {task name: {'state', 'seconds', ...}} for the tasks seen so far."""
+    with _lock:
+        return {name: dict(state) for name, state in _status.items()}
+
+
+def ready(name):
+    with _lock:
+        return _status.get(name, {}).get("state") == "done"
+
+
+def render_warmup_status():
+    """Sidebar progress while the warm-up is still running."""
+    import streamlit as st
+    status = warmup_status()
+    if not status:
+        return
+    finished = sum(s["state"] in ("done", "failed") for s in status.values())
+    if finished < len(status):
+        st.sidebar.progress(finished / len(status), text=f"Warming caches: {finished}/{len(status)} ready")
+    failed = [name for name, s in status.items() if s["state"] == "failed"]
+    if failed:
+        st.sidebar.caption(f"Warm-up failed for: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    run_warmup(verbose=True)
+    print(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,237 @@
+"""
+Columnar store of historical water-level measurements.
+
+The store is a Parquet file sorted by (objectid, date) holding one row per
+measurement. On load, the sorted OBJECTID column gives a per-well offset
+index, so a hydrograph is a slice. Region trends gather the slices of their
+wells, and per-well decline rates are computed once for the whole store with
+segmented reductions.
+
+Build the store from a GWSI water-level export (CSV or Parquet):
+
+    python waterlevels.py source.csv [--out water_levels.parquet] [--site-col SITE_ID]
+        [--date-col WLWA_MEASUREMENT_DATE] [--dtw-col WLWA_DEPTH_TO_WATER]
+"""
+import argparse
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from datasets import dataset_version, get_metadata
+from profiling import timed
+
+WATER_LEVELS_PATH = os.environ.get("WELL_EXPLORER_WATER_LEVELS", "water_levels.parquet")
+
+STORE_SCHEMA = pa.schema([
+    ('objectid', pa.int64()),
+    ('site_id', pa.int64()),
+    ('date', pa.date32()),
+    ('wl_dtw', pa.float32()),
+])
+
+# Source column names tried (case-insensitively) when none are given
+SITE_COLUMNS = ['objectid', 'site_id', 'site_well_site_id']
+DATE_COLUMNS = ['wlwa_measurement_date', 'measurement_date', 'wl_date', 'date']
+DTW_COLUMNS = ['wlwa_depth_to_water', 'depth_to_water', 'wl_dtw', 'dtw']
+
+DAYS_PER_YEAR = 365.25
+
+# Wells need this many measurements over this many years for a decline rate
+MIN_TREND_MEASUREMENTS = 5
+MIN_TREND_YEARS = 5
+
+_store = None
+_lock = threading.Lock()
+
+
+class WaterLevelStore:
+    """Water levels sorted by well, with the offsets of each well's measurements."""
+
+    def __init__(self, objectid, site_id, date, dtw):
+        self.objectid = np.asarray(objectid, dtype=np.int64)
+        self.site_id = np.asarray(site_id, dtype=np.int64)
+        self.date = np.asarray(date, dtype='datetime64[D]')
+        self.dtw = np.asarray(dtw, dtype=np.float32)
+        self.ids, starts = np.unique(self.objectid, return_index=True)
+        self.offsets = np.append(starts, len(self.objectid))
+        self._trends = None
+
+    @classmethod
+    def from_parquet(cls, path):
+        table = pq.read_table(path, columns=STORE_SCHEMA.names, memory_map=True)
+        return cls(table['objectid'].to_numpy(), pc.fill_null(table['site_id'], -1).to_numpy(),
+                   table['date'].to_numpy(), table['wl_dtw'].to_numpy())
+
+    def __len__(self):
+        return len(self.objectid)
+
+    def _slots(self, objectids):
+        """Index into self.ids of each known objectid (unknown ones are dropped)."""
+        objectids = np.asarray(objectids, dtype=np.int64)
+        slots = np.searchsorted(self.ids, objectids)
+        slots = slots[slots < len(self.ids)]
+        return slots[np.isin(self.ids[slots], objectids)]
+
+    def positions(self, objectids):
+        """Row positions of every measurement of the given wells."""
+        slots = self._slots(objectids)
+        starts, ends = self.offsets[slots], self.offsets[slots + 1]
+        lengths = ends - starts
+        # Concatenated ranges without a Python loop
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    def hydrograph(self, objectid):
+        """Measurements of one well ordered by date."""
+        slots = self._slots([objectid])
+        if len(slots) == 0:
+            return pd.DataFrame({'date': pd.Series(dtype='datetime64[s]'), 'wl_dtw': pd.Series(dtype=np.float32)})
+        start, end = self.offsets[slots[0]], self.offsets[slots[0] + 1]
+        return pd.DataFrame({'date': self.date[start:end].astype('datetime64[s]'), 'wl_dtw': self.dtw[start:end]})
+
+    def annual_median(self, objectids=None):
+        """Median depth to water by calendar year over the given wells (all wells if None).
+
+        Returns a frame with 'year', 'median_dtw', 'measurements' and 'wells'.
+        """
+        pos = slice(None) if objectids is None else self.positions(objectids)
+        years = self.date[pos].astype('datetime64[Y]').astype(np.int64) + 1970
+        frame = pd.DataFrame({'year': years, 'wl_dtw': self.dtw[pos], 'objectid': self.objectid[pos]})
+        grouped = frame.groupby('year', sort=True)
+        return pd.DataFrame({
+            'median_dtw': grouped['wl_dtw'].median(),
+            'measurements': grouped['wl_dtw'].count(),
+            'wells': grouped['objectid'].nunique(),
+        }).reset_index()
+
+    def trends(self):
+        """Least-squares DTW trend of every well, computed once per store.
+
+        Returns a frame indexed by objectid with 'ft_per_decade' (positive
+        means the water table is falling), 'measurements', 'first_date' and
+        'last_date'.
+        """
+        if self._trends is None and len(self.ids) == 0:
+            self._trends = pd.DataFrame({'ft_per_decade': [], 'measurements': [], 'first_date': [], 'last_date': []},
+                                        index=pd.Index([], name='objectid', dtype=np.int64))
+        if self._trends is None:
+            t = self.date.astype(np.int64) / DAYS_PER_YEAR
+            y = self.dtw.astype(np.float64)
+            valid = ~np.isnan(y)
+            starts = self.offsets[:-1]
+            counts = np.add.reduceat(valid.astype(np.int64), starts)
+            safe = np.maximum(counts, 1)
+            t_mean = np.add.reduceat(np.where(valid, t, 0), starts) / safe
+            y_mean = np.add.reduceat(np.where(valid, y, 0), starts) / safe
+            lengths = np.diff(self.offsets)
+            dt = np.where(valid, t - np.repeat(t_mean, lengths), 0)
+            dy = np.where(valid, y - np.repeat(y_mean, lengths), 0)
+            var_t = np.add.reduceat(dt * dt, starts)
+            cov = np.add.reduceat(dt * dy, starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                slope = np.where(var_t > 0, cov / var_t, np.nan)
+            self._trends = pd.DataFrame({
+                'ft_per_decade': slope * 10,
+                'measurements': counts,
+                'first_date': self.date[starts].astype('datetime64[s]'),
+                'last_date': self.date[self.offsets[1:] - 1].astype('datetime64[s]'),
+            }, index=pd.Index(self.ids, name='objectid'))
+        return self._trends
+
+    def declining_wells(self, min_ft_per_decade, objectids=None,
+                        min_measurements=MIN_TREND_MEASUREMENTS, min_years=MIN_TREND_YEARS):
+        """Wells whose DTW increased by more than min_ft_per_decade, steepest first."""
+        trends = self.trends()
+        if objectids is not None:
+            trends = trends[trends.index.isin(objectids)]
+        span_years = (trends['last_date'] - trends['first_date']).dt.days / DAYS_PER_YEAR
+        keep = ((trends['ft_per_decade'] > min_ft_per_decade)
+                & (trends['measurements'] >= min_measurements) & (span_years >= min_years))
+        return trends[keep].sort_values('ft_per_decade', ascending=False)
+
+
+def has_water_levels(path=WATER_LEVELS_PATH):
+    return os.path.exists(path)
+
+
+def water_levels_version(path=WATER_LEVELS_PATH):
+    """Version stamp of the store file (None if it has not been built)."""
+    return dataset_version(path) if has_water_levels(path) else None
+
+
+@timed
+def get_water_levels(path=WATER_LEVELS_PATH):
+    """Return the shared WaterLevelStore (reloaded when the file changes), or None if it has not been built."""
+    global _store
+    version = water_levels_version(path)
+    if version is None:
+        return None
+    with _lock:
+        if _store is None or _store[0] != version:
+            _store = (version, WaterLevelStore.from_parquet(path))
+        return _store[1]
+
+
+def _find_column(columns, requested, candidates, label):
+    lookup = {c.lower().strip(): c for c in columns}
+    for name in ([requested] if requested else candidates):
+        if name.lower().strip() in lookup:
+            return lookup[name.lower().strip()]
+    raise KeyError(f"No {label} column found (tried {[requested] if requested else candidates})")
+
+
+def build_water_level_store(source, out=WATER_LEVELS_PATH, site_col=None, date_col=None, dtw_col=None):
+    """Convert a water-level export into the sorted store and return its row count.
+
+    Measurements are matched to wells by OBJECTID if the source has it,
+    otherwise by SITE_ID through wells_metadata.parquet.
+    """
+    if source.endswith(".parquet"):
+        raw = pd.read_parquet(source)
+    else:
+        raw = pd.read_csv(source, low_memory=False)
+    site_col = _find_column(raw.columns, site_col, SITE_COLUMNS, "well id")
+    date_col = _find_column(raw.columns, date_col, DATE_COLUMNS, "measurement date")
+    dtw_col = _find_column(raw.columns, dtw_col, DTW_COLUMNS, "depth to water")
+
+    sites = get_metadata(['objectid', 'site_id']).dropna()
+    if site_col.lower().strip() == 'objectid':
+        objectid = pd.to_numeric(raw[site_col], errors='coerce')
+        site_id = objectid.map(sites.set_index('objectid')['site_id'])
+    else:
+        site_id = pd.to_numeric(raw[site_col], errors='coerce')
+        # A site can appear on several metadata rows; the first objectid is used
+        objectid = site_id.map(sites.drop_duplicates('site_id').set_index('site_id')['objectid'])
+
+    levels = pd.DataFrame({
+        'objectid': objectid,
+        'site_id': site_id,
+        'date': pd.to_datetime(raw[date_col], errors='coerce').dt.normalize(),
+        'wl_dtw': pd.to_numeric(raw[dtw_col], errors='coerce'),
+    }).dropna(subset=['objectid', 'date'])
+    levels = levels.astype({'objectid': np.int64, 'site_id': 'Int64', 'wl_dtw': np.float32})
+    levels = levels.sort_values(['objectid', 'date'], kind='stable')
+
+    table = pa.Table.from_pandas(levels, preserve_index=False).cast(STORE_SCHEMA)
+    tmp_path = f"{out}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, out)
+    return len(levels)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the water-level time-series store.")
+    parser.add_argument("source", help="GWSI water-level export (.csv or .parquet)")
+    parser.add_argument("--out", default=WATER_LEVELS_PATH)
+    parser.add_argument("--site-col", default=None, help="OBJECTID or SITE_ID column")
+    parser.add_argument("--date-col", default=None)
+    parser.add_argument("--dtw-col", default=None)
+    args = parser.parse_args()
+
+    rows = build_water_level_store(args.source, args.out, args.site_col, args.date_col, args.dtw_col)
+    store = WaterLevelStore.from_parquet(args.out)
+    print(f"Wrote {rows:,} measurements for {len(store.ids):,} wells to {args.out}")
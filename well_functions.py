@@ -1,26 +1,51 @@
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+"""
+Plotting and summary functions for the wells dataset.
+
+Importing this module is cheap: pandas, plotly, the dataset and the JSON
+schema are loaded on first use. Functions take the wells as an explicit
+`data` argument and fall back to the shared dataset (datasets.get_wells)
+when it is omitted.
+"""
 import json
+import threading
+
+from figure_cache import cached_figure
+from profiling import timed
 
 DEFAULT_HEIGHT = 768
 
+SCHEMA_PATH = "docs/wells_schema.json"
+
+_column_labels = None
+_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # `df` and the schema used to be loaded at import; they are now read on first access
+    if name == 'df':
+        from datasets import get_wells
+        return get_wells()
+    if name == 'schema':
+        return load_schema()
+    if name == 'column_labels':
+        return get_column_labels()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Load the cleaned dataset (cached so it's only read once)
-df = pd.read_parquet("wells_cleaned_main.parquet")
-df.columns = df.columns.str.lower().str.strip()
 
-# Ensure coordinates exist
-if 'x' not in df.columns and 'dd_long' in df.columns:
-    df['x'] = df['dd_long']
-if 'y' not in df.columns and 'dd_lat' in df.columns:
-    df['y'] = df['dd_lat']
+def load_schema(path=SCHEMA_PATH):
+    """Load the column descriptions from the JSON schema."""
+    with open(path, "r") as f:
+        return json.load(f)
 
-# Load column descriptions from JSON schema
-with open("docs/wells_schema.json", "r") as f:
-    schema = json.load(f)
 
-column_labels = {entry["name"].lower(): entry["description"] for entry in schema}
+def get_column_labels():
+    """Lower-case column name -> description from the schema (read once)."""
+    global _column_labels
+    with _lock:
+        if _column_labels is None:
+            _column_labels = {entry["name"].lower(): entry["description"] for entry in load_schema()}
+        return _column_labels
+
 
 # Custom aliases for user-friendly labels
 custom_aliases = {
@@ -40,22 +65,29 @@ custom_aliases = {
     "rock_name": "Rock Name"
 }
 
+@timed
 def get_label(col):
     col = col.lower()
-    return custom_aliases.get(col, column_labels.get(col, col))
+    return custom_aliases.get(col, get_column_labels().get(col, col))
 
+@timed
 def ensure_coordinates(df):
-    """Ensure DataFrame has 'x' and 'y' columns based on 'dd_long' and 'dd_lat'."""
-    df.columns = df.columns.str.lower().str.strip()
+    """Return df with lower-case columns and 'x'/'y' based on 'dd_long' and 'dd_lat'.
+
+    The input frame is left untouched so shared dataset views stay read-only.
+    """
+    df = df.rename(columns=lambda c: c.lower().strip())
     if 'x' not in df.columns and 'dd_long' in df.columns:
-        df['x'] = df['dd_long']
+        df = df.assign(x=df['dd_long'])
     if 'y' not in df.columns and 'dd_lat' in df.columns:
-        df['y'] = df['dd_lat']
+        df = df.assign(y=df['dd_lat'])
     return df
 
+@timed
 def get_label(col):
-    return column_labels.get(col.lower(), col)
+    return get_column_labels().get(col.lower(), col)
 
+@timed
 def get_available_columns():
     """Return value (z-coordinate) fields and group-by fields."""
     value_columns = ['well_depth', 'wl_dtw', 'wl_elev']
@@ -63,12 +95,80 @@ def get_available_columns():
                         'rock_name', 'aq_name', 'name_abbr', 'basin_name_1', 'subbasin_name']
     return value_columns, group_by_columns
 
-def get_summary_stats(value_col, group_col):
-    """Calculate summary statistics grouped by a category."""
-    return df.groupby(group_col)[value_col].describe().reset_index()
-
-def make_boxplot(value_col, group_col, selected_group=None):
-    data = df[df[group_col] == selected_group] if selected_group else df
+_group_index = None
+
+@timed
+def get_group_index():
+    """Return the group index over every group-by column of the shared dataset (built once)."""
+    global _group_index
+    if _group_index is None:
+        from datasets import get_wells
+        from group_index import GroupIndex
+        _, group_by_columns = get_available_columns()
+        _group_index = GroupIndex(get_wells(), group_by_columns)
+    return _group_index
+
+@timed
+def select_group(data, group_col, selected_group):
+    """Return the rows of data in selected_group, ignoring case and surrounding spaces."""
+    if not (selected_group and group_col):
+        return data
+    index = get_group_index()
+    if group_col in index.columns and index.covers(data):
+        return index.take(data, group_col, selected_group)
+    from group_index import normalize_group, normalized_categorical
+    mask = normalized_categorical(data[group_col]) == normalize_group(selected_group)
+    return data[mask]
+
+@timed
+def shared_frame_token(data):
+    """Figure-cache key for data if it is an unfiltered view of the shared dataset, else None."""
+    if not get_group_index().covers(data):
+        return None
+    return ('wells',) + tuple(data.columns)
+
+@timed
+def get_wells_data(filters=None, columns=None):
+    """Return the shared dataset, or only the wells and columns matching filters (a query.WellFilter).
+
+    Without filters the whole shared frame is returned so the group index still applies.
+    """
+    if not filters:
+        from datasets import get_wells
+        return get_wells()
+    from query import run_query
+    return run_query(filters, columns)
+
+@timed
+def get_summary_stats(value_col, group_col, approx=None, filters=None, data=None):
+    """Calculate summary statistics grouped by a category.
+
+    data defaults to the shared dataset narrowed by filters (filters are not
+    applied to an explicit data frame). Over the unfiltered shared dataset all
+    value columns are summarized together on first use and memoized per
+    dataset version, so later calls for any value column are a lookup.
+    Other frames are summarized directly.
+    """
+    if data is None:
+        data = get_wells_data(filters, [group_col, value_col])
+    if not get_group_index().covers(data):
+        summary = data.groupby(group_col, observed=True, sort=True)[value_col].describe()
+        summary.index.name = group_col
+        return summary.reset_index()
+    import stats_engine
+    from datasets import dataset_version
+    value_columns, _ = get_available_columns()
+    columns = value_columns if value_col in value_columns else [value_col]
+    table = stats_engine.get_summary_table(data, group_col, columns, dataset_version(), approx=approx)
+    return stats_engine.describe_group(table, value_col, group_col)
+
+@timed
+@cached_figure("boxplot", frame_token=shared_frame_token)
+def make_boxplot(value_col, group_col, selected_group=None, filters=None, data=None):
+    import plotly.express as px
+    if data is None:
+        data = get_wells_data(filters, [group_col, value_col])
+    data = select_group(data, group_col, selected_group)
     fig = px.box(data, x=group_col, y=value_col, color=group_col if not selected_group else None, points="outliers")
     fig.update_layout(
         title=f"Boxplot of {get_label(value_col)} by {get_label(group_col)}",
@@ -79,8 +179,13 @@ def make_boxplot(value_col, group_col, selected_group=None):
     )
     return fig
 
-def make_histogram(value_col, selected_group=None, group_col=None):
-    data = df[df[group_col] == selected_group] if selected_group and group_col else df
+@timed
+@cached_figure("histogram", frame_token=shared_frame_token)
+def make_histogram(value_col, selected_group=None, group_col=None, filters=None, data=None):
+    import plotly.express as px
+    if data is None:
+        data = get_wells_data(filters, [value_col] + ([group_col] if group_col else []))
+    data = select_group(data, group_col, selected_group)
     fig = px.histogram(data, y=value_col, nbins=40)
     fig.update_layout(
         title=f"Depth Distribution of {get_label(value_col)}",
@@ -91,11 +196,21 @@ def make_histogram(value_col, selected_group=None, group_col=None):
     )
     return fig
 
-def make_scatter_xyz(value_col, selected_group=None, group_col=None):
-    data = df[df[group_col] == selected_group] if selected_group and group_col else df
+@timed
+@cached_figure("scatter_xyz", frame_token=shared_frame_token)
+def make_scatter_xyz(value_col, selected_group=None, group_col=None, point_budget=None, filters=None, data=None):
+    """3D scatter of wells; with point_budget, wells are decimated by spatial binning first."""
+    import plotly.express as px
+    from decimation import decimate_points
+    if data is None:
+        data = get_wells_data(filters, ['x', 'y', value_col] + ([group_col] if group_col else []))
+    data = select_group(data, group_col, selected_group)
     color_col = group_col if not selected_group and group_col else value_col
-    fig = px.scatter_3d(data, x='x', y='y', z=value_col, color=color_col,
-                        title=f"3D Scatter Plot of {get_label(value_col)}")
+    data, hidden = decimate_points(data, point_budget, stratify_col=group_col if color_col == group_col else None)
+    title = f"3D Scatter Plot of {get_label(value_col)}"
+    if hidden:
+        title += f" (showing {len(data):,} of {len(data) + hidden:,} wells)"
+    fig = px.scatter_3d(data, x='x', y='y', z=value_col, color=color_col, title=title)
     fig.update_layout(
         height=DEFAULT_HEIGHT,
         scene=dict(
@@ -105,17 +220,132 @@ def make_scatter_xyz(value_col, selected_group=None, group_col=None):
         )
     )
     fig.update_traces(marker=dict(size=2))
+    fig.update_layout(meta=dict(hidden_points=hidden))
     return fig
 
+@timed
+@cached_figure("surface")
+def make_surface_plot(value_col, group_col=None, selected_group=None, resolution=None, method="idw"):
+    """Interpolated surface of value_col clipped to the selected region (state-wide if none).
 
+    resolution defaults to interpolation.DEFAULT_RESOLUTION.
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+    from interpolation import DEFAULT_RESOLUTION, get_surface
+    resolution = resolution or DEFAULT_RESOLUTION
+    raster = get_surface(value_col, group_col, selected_group, resolution, method)
+    fig = go.Figure(go.Heatmap(
+        x=raster['lon'],
+        y=raster['lat'],
+        z=raster['values'],
+        colorscale='Viridis_r' if value_col == 'wl_dtw' else 'Viridis',
+        colorbar=dict(title=get_label(value_col)),
+        hovertemplate="Lon %{x:.3f}, Lat %{y:.3f}<br>%{z:.1f}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=f"Interpolated {get_label(value_col)} ({method.upper()}, {int(raster['wells'])} wells)",
+        xaxis_title=get_label('longitude'),
+        yaxis_title=get_label('latitude'),
+        yaxis=dict(scaleanchor='x', scaleratio=1 / np.cos(np.radians(np.mean(raster['lat']))) if len(raster['lat']) else 1),
+        height=DEFAULT_HEIGHT
+    )
+    return fig
 
+def _group_objectids(group_col, selected_group):
+    """OBJECTIDs of the wells in selected_group (None for all wells)."""
+    if not (group_col and selected_group):
+        return None
+    from datasets import get_wells
+    return select_group(get_wells(), group_col, selected_group)['objectid'].to_numpy()
+
+def _water_levels_version():
+    # Wrapped so the water-level store module is only imported when a figure is requested
+    from waterlevels import water_levels_version
+    return water_levels_version()
+
+@timed
+@cached_figure("hydrograph", version=_water_levels_version)
+def make_hydrograph(objectid):
+    """Depth to water over time for one well from the water-level store."""
+    import pandas as pd
+    import plotly.express as px
+    from waterlevels import get_water_levels
+    store = get_water_levels()
+    data = store.hydrograph(objectid) if store is not None else pd.DataFrame({'date': [], 'wl_dtw': []})
+    fig = px.line(data, x='date', y='wl_dtw', markers=True)
+    fig.update_layout(
+        title=f"Hydrograph of Well {objectid}",
+        xaxis_title="Date",
+        yaxis_title=get_label('wl_dtw'),
+        height=DEFAULT_HEIGHT // 2,
+        yaxis=dict(autorange="reversed")
+    )
+    return fig
 
-import plotly.graph_objects as go
-import plotly.express as px
+@timed
+@cached_figure("dtw_trend", version=_water_levels_version)
+def make_dtw_trend(group_col=None, selected_group=None):
+    """Median depth to water by year over the wells of a group (all wells if none is selected)."""
+    import pandas as pd
+    import plotly.express as px
+    from waterlevels import get_water_levels
+    store = get_water_levels()
+    objectids = _group_objectids(group_col, selected_group)
+    data = store.annual_median(objectids) if store is not None else pd.DataFrame(
+        {'year': [], 'median_dtw': [], 'measurements': [], 'wells': []})
+    fig = px.line(data, x='year', y='median_dtw', markers=True, hover_data=['measurements', 'wells'])
+    fig.update_layout(
+        title=f"Median {get_label('wl_dtw')} by Year" + (f" in {selected_group}" if selected_group else ""),
+        xaxis_title="Year",
+        yaxis_title=get_label('wl_dtw'),
+        height=DEFAULT_HEIGHT // 2,
+        yaxis=dict(autorange="reversed")
+    )
+    return fig
 
-import plotly.graph_objects as go
-import plotly.express as px
+@timed
+def get_declining_wells(min_ft_per_decade, group_col=None, selected_group=None):
+    """Wells whose depth to water grew by more than min_ft_per_decade, steepest first.
 
+    Returns an empty frame when the water-level store has not been built.
+    """
+    import pandas as pd
+    from waterlevels import get_water_levels
+    store = get_water_levels()
+    if store is None:
+        return pd.DataFrame(columns=['objectid', 'ft_per_decade', 'measurements', 'first_date', 'last_date'])
+    return store.declining_wells(min_ft_per_decade, _group_objectids(group_col, selected_group)).reset_index()
+
+@timed
+def _vertical_segments(group):
+    """Build NaN-separated line arrays for a set of wells.
+
+    Each well contributes (top, bottom, gap) vertices; hover text is only
+    attached to the top vertex to keep the figure payload small.
+    """
+    import numpy as np
+    n = len(group)
+    gap = np.full(n, np.nan)
+    x = np.column_stack([group['x'], group['x'], gap]).ravel()
+    y = np.column_stack([group['y'], group['y'], gap]).ravel()
+    z = np.column_stack([group['z_top'], group['z_bottom'], gap]).ravel()
+
+    site_id = group['site_id'].astype(str) if 'site_id' in group.columns else 'N/A'
+    text = (
+        "Well ID: " + site_id + "<br>"
+        + "Water Use: " + group['water_use'].astype(str) + "<br>"
+        + "Elevation: " + group['z_top'].map('{:.2f}'.format) + " m<br>"
+        + "DTW: " + group['wl_dtw'].astype(str) + "<br>"
+        + "Depth: " + (group['well_depth'].map('{:g}'.format) if 'well_depth' in group.columns else 'N/A')
+    ).to_numpy(dtype=object)
+    blank = np.full(n, '', dtype=object)
+    hovertext = np.column_stack([text, blank, blank]).ravel()
+    return x, y, z, hovertext
+
+
+@timed
+@cached_figure("well_vertical", frame_token=shared_frame_token)
 def make_well_vertical_plot(df, metadata=None, selected_group=None, group_col=None, depth_mode='wl_dtw'):
     """
     Creates a 3D vertical profile plot of wells, color-coded by WATER_USE, with legend.
@@ -123,23 +353,21 @@ def make_well_vertical_plot(df, metadata=None, selected_group=None, group_col=No
     Parameters:
         df (DataFrame): Main well dataset.
         metadata (DataFrame, optional): Must include 'OBJECTID' and 'WATER_USE'.
+            Not needed when df already carries 'water_use' (see datasets.get_wells).
         selected_group (str): Value to filter group_col.
         group_col (str): Column to group/filter on.
         depth_mode (str): 'wl_dtw' or 'well_depth'.
     """
-    df.columns = df.columns.str.lower().str.strip()
+    import plotly.express as px
+    import plotly.graph_objects as go
+    df = ensure_coordinates(df)
 
-    if metadata is not None:
-        metadata.columns = metadata.columns.str.lower().str.strip()
+    if metadata is not None and 'water_use' not in df.columns:
+        metadata = metadata.rename(columns=lambda c: c.lower().strip())
         if 'objectid' in df.columns and 'objectid' in metadata.columns:
             df = df.merge(metadata[['objectid', 'water_use']], on='objectid', how='left')
 
-    df = ensure_coordinates(df)
-
-    if selected_group and group_col:
-        df[group_col] = df[group_col].astype(str).str.strip().str.lower()
-        selected_group = selected_group.lower()
-        df = df[df[group_col] == selected_group]
+    df = select_group(df, group_col, selected_group)
 
     if depth_mode == 'wl_dtw':
         df = df.dropna(subset=['x', 'y', 'well_alt', 'wl_dtw'])
@@ -161,35 +389,21 @@ def make_well_vertical_plot(df, metadata=None, selected_group=None, group_col=No
 
     fig = go.Figure()
 
-    # Add one trace per water_use group
-    for water_use, group in df.groupby('water_use'):
+    # Add one trace per water_use group; wells are separated by NaN gaps
+    for water_use, group in df.groupby('water_use', observed=True):
         color = color_map.get(water_use, 'gray')
-        for _, row in group.iterrows():
-            fig.add_trace(go.Scatter3d(
-                x=[row['x'], row['x']],
-                y=[row['y'], row['y']],
-                z=[row['z_top'], row['z_bottom']],
-                mode='lines',
-                line=dict(color=color, width=3),
-                name=water_use,
-                hovertext=(
-                    f"Well ID: {row.get('site_id', 'N/A')}<br>"
-                    f"Water Use: {row.get('water_use', 'N/A')}<br>"
-                    f"Elevation: {row['z_top']:.2f} m<br>"
-                    f"DTW: {row.get('wl_dtw', 'N/A')}<br>"
-                    f"Depth: {row.get('well_depth', 'N/A')}"
-                ),
-                hoverinfo='text',
-                showlegend=False  # Suppress legend on per-well lines
-            ))
-        # Add one dummy trace per group for legend
+        x, y, z, hovertext = _vertical_segments(group)
         fig.add_trace(go.Scatter3d(
-            x=[None],
-            y=[None],
-            z=[None],
+            x=x,
+            y=y,
+            z=z,
             mode='lines',
-            line=dict(color=color, width=4),
+            line=dict(color=color, width=3),
             name=water_use,
+            legendgroup=water_use,
+            hovertext=hovertext,
+            hoverinfo='text',
+            connectgaps=False,
             showlegend=True
         ))
 
@@ -208,11 +422,12 @@ def make_well_vertical_plot(df, metadata=None, selected_group=None, group_col=No
 
 
 if __name__ == "__main__":
+    from datasets import get_wells
+    df = get_wells()
     value_col = "well_depth"
     group_col = "basin_name_1"
 
-    unique_groups = df[group_col].dropna().unique()
-    unique_groups.sort()
+    unique_groups = sorted(df[group_col].dropna().unique())
 
     print("Available groups for '{}':".format(group_col))
     for i, group in enumerate(unique_groups):
@@ -228,6 +443,5 @@ if __name__ == "__main__":
     #make_boxplot(value_col, group_col, selected_group).show()
     #make_histogram(value_col, selected_group, group_col).show()
     #make_scatter_xyz(value_col, selected_group, group_col).show()
-    metadata = pd.read_parquet(r"wells_metadata.parquet")
-    make_well_vertical_plot(df, metadata=metadata)
+    make_well_vertical_plot(df)
 